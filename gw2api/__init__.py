@@ -1,6 +1,9 @@
 import os
-import requests
+import fnmatch
 
+from .cache import FileCache, SqliteCache
+from .ratelimit import TokenBucket
+from .transport import Transport
 
 VERSION = "v1"
 BASE_URL = "https://api.guildwars2.com/%s/" % VERSION
@@ -23,32 +26,82 @@ LINK_TYPES = {
     "objective": TYPE_OBJECTIVE,
 }
 
-session = requests.Session()
+transport = Transport()
+session = None
 cache_dir = None
+cache_backend = None
 cache_time = 14 * 24 * 3600
+cache_policies = {}
+build_check_interval = None
+max_stale = None
+rate_limits = {}
+max_retries = 3
+retry_backoff = 1.0
+
+
+def set_transport(trans):
+    """Set the :class:`gw2api.transport.Transport` to send all API requests
+    with, for example to change the connection pool size or timeouts::
+
+        gw2api.set_transport(gw2api.Transport(pool_maxsize=64, timeout=10))
+    """
+    global transport, session
+    transport = trans
+    session = trans.session
 
 
 def set_session(sess):
-    """Set the requests.Session to use for all API requests.
+    """Set the requests.Session to use for all API requests, or ``None`` to
+    use the default transport.
     """
-    global session
-    session = sess
+    set_transport(Transport(session=sess))
 
 
-def set_cache_dir(directory):
+def set_cache_dir(directory, store="files", encoding="json", locking=False):
     """Set the directory to cache JSON responses from most API endpoints.
+
+    :param directory: the cache directory, or ``None`` to disable caching.
+    :param store: ``"files"`` to store every response in a separate JSON
+                  file, or ``"sqlite"`` to store all responses in a single
+                  SQLite database (``cache.sqlite``) in the directory.
+    :param encoding: the encoding of the files when ``store`` is ``"files"``:
+                     ``"json"``, ``"zlib"`` (compressed JSON) or
+                     ``"marshal"``. See :data:`gw2api.cache.encodings`.
+    :param locking: lock cache files while they are refreshed, so processes
+                    sharing the directory do not make the same request at the
+                    same time (``"files"`` only).
     """
-    global cache_dir
+    global cache_dir, cache_backend
 
     if directory is None:
         cache_dir = None
+        cache_backend = None
         return
 
     if not os.path.exists(directory):
         os.makedirs(directory)
     if not os.path.isdir(directory):
         raise ValueError("not a directory")
+    if store == "files":
+        backend = FileCache(directory, encoding, locking)
+    elif store == "sqlite":
+        backend = SqliteCache(os.path.join(directory, "cache.sqlite"))
+    else:
+        raise ValueError("unknown cache store '%s'" % store)
+
     cache_dir = directory
+    cache_backend = backend
+
+
+def set_cache_backend(backend):
+    """Set the backend used to cache JSON responses from most API endpoints.
+
+    :param backend: a :class:`gw2api.cache.CacheBackend` instance, or ``None``
+                    to disable caching.
+    """
+    global cache_dir, cache_backend
+    cache_dir = getattr(backend, "directory", None)
+    cache_backend = backend
 
 
 def set_cache_time(time):
@@ -58,6 +111,89 @@ def set_cache_time(time):
     cache_time = time
 
 
+def set_cache_policy(pattern, time):
+    """Set the maximum lifetime for cached JSON responses from specific
+    endpoints, overriding the global cache time.
+
+    :param pattern: the name of a v2 endpoint (such as ``"commerce/prices"``)
+                    or a v1 path (such as ``"items.json"``). Shell-style
+                    wildcards (``"wvw/*"``) are supported.
+    :param time: the maximum lifetime in seconds, ``0`` to disable caching,
+                 or ``None`` to remove the policy.
+    """
+    if time is None:
+        cache_policies.pop(pattern, None)
+    else:
+        cache_policies[pattern] = time
+
+
+def get_cache_time(name):
+    """Get the maximum lifetime for cached JSON responses from the v2 endpoint
+    or v1 path ``name``. An exact match takes precedence over the longest
+    matching wildcard pattern, which takes precedence over the global time.
+    """
+    if name in cache_policies:
+        return cache_policies[name]
+    for pattern in sorted(cache_policies, key=len, reverse=True):
+        if fnmatch.fnmatchcase(name, pattern):
+            return cache_policies[pattern]
+    return cache_time
+
+
+def set_stale_while_revalidate(max_stale_time):
+    """Return expired responses from the cache immediately, and refresh them
+    in the background.
+
+    :param max_stale_time: the number of seconds after expiry during which a
+                           response may still be returned, or ``None`` to
+                           always wait for the refreshed response.
+    """
+    global max_stale
+    max_stale = max_stale_time
+
+
+def set_build_check_interval(interval):
+    """Cache responses from static v2 endpoints (such as items and recipes)
+    until the game build changes, instead of for ``cache_time`` seconds.
+
+    :param interval: the number of seconds between checks of the current
+                     build, or ``None`` to disable.
+    """
+    global build_check_interval
+    build_check_interval = interval
+
+
+def set_rate_limit(rate, burst=None, token=None):
+    """Limit the number of API requests made by this process.
+
+    :param rate: the average number of requests per second, or ``None`` to
+                 remove the limit.
+    :param burst: the number of requests that may be made at once, defaults
+                  to ``rate``.
+    :param token: an API key to limit only the requests authenticated with
+                  that key. Those requests are also subject to the process
+                  wide limit.
+    """
+    if rate is None:
+        rate_limits.pop(token, None)
+    else:
+        rate_limits[token] = TokenBucket(rate, burst)
+
+
+def set_retries(retries, backoff=None):
+    """Set how often rate limited (HTTP 429) requests are retried.
+
+    :param retries: the maximum number of retries, ``0`` to disable.
+    :param backoff: the delay before the first retry in seconds, which is
+                    doubled for every further retry. A ``Retry-After`` header
+                    in the response takes precedence if it is longer.
+    """
+    global max_retries, retry_backoff
+    max_retries = retries
+    if backoff is not None:
+        retry_backoff = backoff
+
+
 def get_mumble_link():
     from .mumble import gw2link
     return gw2link
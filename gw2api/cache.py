@@ -0,0 +1,591 @@
+import os
+import time
+import json
+import zlib
+import errno
+import marshal
+import sqlite3
+import threading
+import contextlib
+import collections
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+__all__ = ("CacheEntry", "CacheBackend", "FileCache", "MemoryCache",
+           "TieredCache", "SqliteCache", "encodings")
+
+
+def encode_json(value):
+    return json.dumps(value, indent=2).encode("utf-8")
+
+
+def decode_json(data):
+    return json.loads(data.decode("utf-8"))
+
+
+def encode_zlib(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":"))
+                         .encode("utf-8"))
+
+
+def decode_zlib(data):
+    return decode_json(zlib.decompress(data))
+
+
+# os.replace overwrites the destination on all platforms, but is not
+# available on Python 2.
+replace = getattr(os, "replace", os.rename)
+
+
+# Maps the name of an encoding to an (encode, decode) pair of functions.
+# "json" is readable, "zlib" is the smallest on disk and "marshal" is the
+# fastest to load, but its files can only be read by the same major Python
+# version that wrote them.
+encodings = {
+    "json": (encode_json, decode_json),
+    "zlib": (encode_zlib, decode_zlib),
+    "marshal": (marshal.dumps, marshal.loads),
+}
+
+
+class CacheEntry(object):
+    """A cached value together with its expiry metadata.
+
+    :param value: the cached (JSON serializable) value
+    :param timestamp: the time at which the value was stored
+    :param expires: the time after which the value is no longer valid, or
+                    ``None`` if the value does not expire by itself
+    :param info: a dictionary with additional metadata
+    """
+    def __init__(self, value, timestamp=None, expires=None, info=None):
+        super(CacheEntry, self).__init__()
+        self.value = value
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.expires = expires
+        self.info = info or {}
+
+    def is_fresh(self, max_age=None, now=None):
+        """Check whether the entry has not expired and is not older than
+        ``max_age`` seconds.
+        """
+        if now is None:
+            now = time.time()
+        if self.expires is not None and self.expires <= now:
+            return False
+        return max_age is None or self.timestamp >= now - max_age
+
+
+class CacheBackend(object):
+    """Base class for the storage backends used to cache API responses.
+
+    Backends store :class:`CacheEntry` objects by key. Expired entries are
+    still returned by :meth:`get`, so it is up to the caller to decide
+    whether an entry is fresh enough to be used.
+    """
+
+    def get(self, key):
+        """Get the entry stored under ``key``, or ``None``.
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, expires=None, info=None):
+        """Store ``value`` under ``key``.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove the entry stored under ``key``, if there is one.
+        """
+        raise NotImplementedError
+
+    def contains(self, key, max_age=None):
+        """Check whether a fresh entry is stored under ``key``.
+        """
+        entry = self.get(key)
+        return entry is not None and entry.is_fresh(max_age)
+
+    def touch(self, key, expires=None, info=None):
+        """Reset the timestamp and expiry metadata of the entry stored under
+        ``key``, keeping its value.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            self.set(key, entry.value, expires, info)
+
+    def get_many(self, keys):
+        """Get the entries stored under ``keys`` as a dictionary. Keys for
+        which there is no entry are left out.
+        """
+        entries = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    def set_many(self, items, expires=None, info=None):
+        """Store all ``(key, value)`` pairs in ``items``.
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        for key, value in items:
+            self.set(key, value, expires, info)
+
+    @contextlib.contextmanager
+    def locked(self, key):
+        """Hold an exclusive lock on ``key`` inside the ``with`` block, so only
+        one client refreshes an entry at a time. The default implementation
+        does not lock anything.
+        """
+        yield
+
+
+class FileCache(CacheBackend):
+    """Store every entry as a JSON file in ``directory``.
+
+    Expiry metadata and the encoding of the data are written on a header
+    line in front of the data. Files without a header (written by older
+    versions) are read as JSON.
+
+    :param directory: the directory to store the files in
+    :param encoding: the name of the encoding used to write new files, one of
+                     the keys of :data:`encodings`. Files are always read
+                     with the encoding named in their header, so this can be
+                     changed without clearing the cache.
+    :param locking: use advisory file locks (``<key>.lock``) in
+                    :meth:`locked`, so processes sharing the directory do not
+                    refresh the same entry at the same time. Lock files only
+                    exist while the lock is held. Only supported where
+                    :mod:`fcntl` is available.
+
+    Files are written to a temporary file first and then renamed, so readers
+    never see a partially written file.
+    """
+    header_prefix = b"#gw2api-cache "
+
+    def __init__(self, directory, encoding="json", locking=False):
+        super(FileCache, self).__init__()
+        if encoding not in encodings:
+            raise ValueError("unknown cache encoding '%s'" % encoding)
+        if locking and fcntl is None:
+            raise ValueError("file locking is not supported on this platform")
+        self.directory = directory
+        self.encoding = encoding
+        self.locking = locking
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def read_header(self, fp):
+        line = fp.readline()
+        if not line.startswith(self.header_prefix):
+            fp.seek(0)
+            return {}
+        return json.loads(line[len(self.header_prefix):].decode("utf-8"))
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as fp:
+                timestamp = os.fstat(fp.fileno()).st_mtime
+                header = self.read_header(fp)
+                data = fp.read()
+        except (IOError, OSError) as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+        except ValueError:
+            return None
+
+        try:
+            decode = encodings[header.get("encoding", "json")][1]
+            value = decode(data)
+        except (KeyError, ValueError, TypeError, EOFError, zlib.error):
+            return None
+
+        return CacheEntry(value, timestamp, header.get("expires"),
+                          header.get("info"))
+
+    def set(self, key, value, expires=None, info=None):
+        header = json.dumps({"expires": expires, "info": info or {},
+                             "encoding": self.encoding})
+        data = encodings[self.encoding][0](value)
+        path = self.path(key)
+        # Unique for every process and thread that may write at the same time.
+        temp_path = "%s.%d.%d.tmp" % (path, os.getpid(),
+                                      threading.current_thread().ident)
+        try:
+            with open(temp_path, "wb") as fp:
+                fp.write(self.header_prefix + header.encode("utf-8") + b"\n")
+                fp.write(data)
+            replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def delete(self, key):
+        try:
+            os.unlink(self.path(key))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def contains(self, key, max_age=None):
+        now = time.time()
+        try:
+            with open(self.path(key), "rb") as fp:
+                timestamp = os.fstat(fp.fileno()).st_mtime
+                if max_age is not None and timestamp < now - max_age:
+                    return False
+                header = self.read_header(fp)
+        except (IOError, OSError) as e:
+            if e.errno == errno.ENOENT:
+                return False
+            raise
+        except ValueError:
+            return False
+
+        expires = header.get("expires")
+        return expires is None or expires > now
+
+    @contextlib.contextmanager
+    def locked(self, key):
+        if not self.locking:
+            yield
+            return
+
+        path = self.path(key) + ".lock"
+        while True:
+            fp = open(path, "a")
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            try:
+                current = os.stat(path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    fp.close()
+                    raise
+                current = None
+            # The previous holder may have removed the file while we waited,
+            # in which case the lock has to be taken on the new file.
+            if current is not None and \
+                    current.st_ino == os.fstat(fp.fileno()).st_ino:
+                break
+            fp.close()
+
+        try:
+            yield
+        finally:
+            # The file is removed while the lock is held, so the cache
+            # directory does not fill up with lock files.
+            try:
+                os.unlink(path)
+            finally:
+                fp.close()
+
+
+class MemoryCache(CacheBackend):
+    """Keep entries in a dictionary in the memory of the current process.
+
+    Values are stored as-is, without a round trip through JSON, so they
+    should not be modified after they have been stored or retrieved.
+
+    :param max_entries: the maximum number of entries to keep
+    :param max_bytes: the maximum total size of the entries to keep, measured
+                      as the length of their JSON encoding
+
+    When either limit is exceeded, the least recently used entries are
+    evicted. Only fresh entries count as hits in :meth:`stats`.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        super(MemoryCache, self).__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries[key] = entry
+            # Expired entries are returned, but the caller has to look
+            # elsewhere for a fresh value.
+            if entry.is_fresh():
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def set(self, key, value, expires=None, info=None):
+        self.set_entry(key, CacheEntry(value, expires=expires, info=info))
+
+    def set_entry(self, key, entry):
+        """Store a :class:`CacheEntry`, keeping its original timestamp.
+        """
+        size = len(json.dumps(entry.value)) if self.max_bytes else 0
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = entry
+            self.sizes[key] = size
+            self.total_bytes += size
+            self._evict()
+
+    def delete(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def touch(self, key, expires=None, info=None):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = CacheEntry(entry.value, expires=expires,
+                                               info=info)
+
+    def stats(self):
+        """Get the number of hits, misses and the current size of the cache.
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self.entries), "bytes": self.total_bytes}
+
+    def _remove(self, key):
+        if self.entries.pop(key, None) is not None:
+            self.total_bytes -= self.sizes.pop(key)
+
+    def _evict(self):
+        while self.entries and (
+                (self.max_entries and len(self.entries) > self.max_entries) or
+                (self.max_bytes and self.total_bytes > self.max_bytes)):
+            key = next(iter(self.entries))
+            self._remove(key)
+
+
+class TieredCache(CacheBackend):
+    """Put a bounded :class:`MemoryCache` in front of another backend.
+
+    Entries found in the backend are promoted to the memory cache with their
+    original timestamp and expiry time, so hits in the memory cache expire at
+    the same time as they would in the backend, but without touching the
+    filesystem or decoding JSON.
+
+    :param front: the :class:`MemoryCache` to use
+    :param back: the backend to use when an entry is not in memory
+    """
+
+    def __init__(self, front, back):
+        super(TieredCache, self).__init__()
+        self.front = front
+        self.back = back
+        self.directory = getattr(back, "directory", None)
+
+    def get(self, key):
+        entry = self.front.get(key)
+        if entry is None or not entry.is_fresh():
+            # Another process may have refreshed the entry in the backend.
+            back_entry = self.back.get(key)
+            if back_entry is not None and (
+                    entry is None or back_entry.timestamp > entry.timestamp):
+                self.front.set_entry(key, back_entry)
+                entry = back_entry
+        return entry
+
+    def get_many(self, keys):
+        entries = {}
+        missing = []
+        for key in keys:
+            entry = self.front.get(key)
+            if entry is not None:
+                entries[key] = entry
+            if entry is None or not entry.is_fresh():
+                missing.append(key)
+        if missing:
+            for key, back_entry in self.back.get_many(missing).items():
+                entry = entries.get(key)
+                if entry is None or back_entry.timestamp > entry.timestamp:
+                    self.front.set_entry(key, back_entry)
+                    entries[key] = back_entry
+        return entries
+
+    def set(self, key, value, expires=None, info=None):
+        self.back.set(key, value, expires, info)
+        self.front.set(key, value, expires, info)
+
+    def set_many(self, items, expires=None, info=None):
+        if isinstance(items, dict):
+            items = items.items()
+        items = list(items)
+        self.back.set_many(items, expires, info)
+        for key, value in items:
+            self.front.set(key, value, expires, info)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Group all writes made inside the ``with`` block in a single
+        transaction of the backend, if it supports that.
+        """
+        batch = getattr(self.back, "batch", None)
+        if batch is None:
+            yield self
+            return
+        with batch():
+            yield self
+
+    def delete(self, key):
+        self.front.delete(key)
+        self.back.delete(key)
+
+    def touch(self, key, expires=None, info=None):
+        self.back.touch(key, expires, info)
+        self.front.touch(key, expires, info)
+
+    def contains(self, key, max_age=None):
+        return (self.front.contains(key, max_age) or
+                self.back.contains(key, max_age))
+
+    def locked(self, key):
+        return self.back.locked(key)
+
+    def stats(self):
+        return self.front.stats()
+
+
+class SqliteCache(CacheBackend):
+    """Store all entries in a single SQLite database, one row per key.
+
+    :param filename: the database file, or ``":memory:"``
+
+    Use :meth:`set_many` or :meth:`batch` to write many entries in a single
+    transaction.
+    """
+    max_variables = 500
+
+    def __init__(self, filename):
+        super(SqliteCache, self).__init__()
+        self.filename = filename
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        with self.connection:
+            if filename != ":memory:":
+                self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "  key TEXT PRIMARY KEY,"
+                "  value TEXT NOT NULL,"
+                "  timestamp REAL NOT NULL,"
+                "  expires REAL,"
+                "  info TEXT"
+                ")")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_expires "
+                "ON cache (expires)")
+
+    def make_entry(self, row):
+        value, timestamp, expires, info = row
+        return CacheEntry(json.loads(value), timestamp, expires,
+                          json.loads(info) if info else None)
+
+    def make_row(self, key, value, timestamp, expires, info):
+        return (key, json.dumps(value), timestamp, expires,
+                json.dumps(info) if info else None)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Group all writes made inside the ``with`` block in a single
+        transaction. Other threads are blocked until the block is left.
+        """
+        with self.lock:
+            self.batch_depth += 1
+            success = False
+            try:
+                yield self
+                success = True
+            finally:
+                self.batch_depth -= 1
+                if not self.batch_depth:
+                    if success:
+                        self.connection.commit()
+                    else:
+                        self.connection.rollback()
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, timestamp, expires, info FROM cache "
+                "WHERE key = ?", (key, )).fetchone()
+        return self.make_entry(row) if row is not None else None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        entries = {}
+        for i in range(0, len(keys), self.max_variables):
+            chunk = keys[i:i + self.max_variables]
+            query = ("SELECT key, value, timestamp, expires, info FROM cache "
+                     "WHERE key IN (%s)" % ",".join("?" * len(chunk)))
+            with self.lock:
+                rows = self.connection.execute(query, chunk).fetchall()
+            for row in rows:
+                entries[row[0]] = self.make_entry(row[1:])
+        return entries
+
+    def set(self, key, value, expires=None, info=None):
+        self.set_many([(key, value)], expires, info)
+
+    def set_many(self, items, expires=None, info=None):
+        if isinstance(items, dict):
+            items = items.items()
+        now = time.time()
+        rows = [self.make_row(key, value, now, expires, info)
+                for key, value in items]
+        with self.batch():
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cache "
+                "(key, value, timestamp, expires, info) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def delete(self, key):
+        with self.batch():
+            self.connection.execute("DELETE FROM cache WHERE key = ?",
+                                    (key, ))
+
+    def touch(self, key, expires=None, info=None):
+        with self.batch():
+            self.connection.execute(
+                "UPDATE cache SET timestamp = ?, expires = ?, info = ? "
+                "WHERE key = ?",
+                (time.time(), expires, json.dumps(info) if info else None,
+                 key))
+
+    def contains(self, key, max_age=None):
+        now = time.time()
+        min_timestamp = now - max_age if max_age is not None else None
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM cache WHERE key = ? "
+                "AND (expires IS NULL OR expires > ?) "
+                "AND (? IS NULL OR timestamp >= ?)",
+                (key, now, min_timestamp, min_timestamp)).fetchone()
+        return row is not None
+
+    def prune(self):
+        """Remove all expired entries. Returns the number of removed entries.
+        """
+        with self.batch():
+            cursor = self.connection.execute(
+                "DELETE FROM cache WHERE expires <= ?", (time.time(), ))
+        return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
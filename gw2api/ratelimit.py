@@ -0,0 +1,164 @@
+import time
+import random
+import threading
+from email.utils import parsedate_tz, mktime_tz
+
+import gw2api
+
+
+__all__ = ("TokenBucket", "stats", "reset_stats")
+
+# time.monotonic is not affected by changes to the system clock, but is not
+# available on Python 2.
+clock = getattr(time, "monotonic", time.time)
+
+counters = {}
+counters_lock = threading.Lock()
+
+
+class TokenBucket(object):
+    """Limit requests to ``rate`` per second on average, while allowing
+    bursts of up to ``burst`` requests.
+
+    :param rate: the number of requests per second
+    :param burst: the maximum number of requests that can be made at once,
+                  defaults to ``rate`` (but at least one)
+    """
+
+    def __init__(self, rate, burst=None):
+        super(TokenBucket, self).__init__()
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else max(1, rate)
+        self.tokens = self.burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token from the bucket. Returns the number of seconds to wait
+        before making the request. Waiting callers are served in order.
+        """
+        with self.lock:
+            now = clock()
+            self.tokens = min(self.burst, self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+def record(name, value=1):
+    with counters_lock:
+        counters[name] = counters.get(name, 0) + value
+
+
+def stats():
+    """Get the rate limiter metrics since the last reset:
+
+    * ``requests``: the number of requests sent
+    * ``waits``: the number of requests delayed by a rate limiter
+    * ``wait_time``: the total number of seconds requests were delayed
+    * ``rate_limited``: the number of responses with status 429
+    * ``retries``: the number of rate limited requests that were retried
+    * ``retry_wait_time``: the total number of seconds spent in backoff
+    """
+    with counters_lock:
+        result = dict.fromkeys(("requests", "waits", "rate_limited",
+                                "retries"), 0)
+        result.update(wait_time=0.0, retry_wait_time=0.0)
+        result.update(counters)
+        return result
+
+
+def reset_stats():
+    with counters_lock:
+        counters.clear()
+
+
+def api_key(kwargs):
+    """Get the API key a request is authenticated with, or ``None``.
+    """
+    authorization = (kwargs.get("headers") or {}).get("Authorization")
+    if authorization and authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):]
+    return None
+
+
+def reserve(key=None):
+    """Take a token from the process wide rate limiter, and from the rate
+    limiter for the API key ``key``. Returns the number of seconds to wait
+    before making the request.
+    """
+    delay = 0.0
+    for name in (None, key) if key is not None else (None, ):
+        bucket = gw2api.rate_limits.get(name)
+        if bucket is not None:
+            delay = max(delay, bucket.reserve())
+
+    record("requests")
+    if delay:
+        record("waits")
+        record("wait_time", delay)
+    return delay
+
+
+def parse_retry_after(value):
+    """Parse a ``Retry-After`` header, which is either a number of seconds or
+    an HTTP date. Returns the number of seconds, or ``None``.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0.0, mktime_tz(date) - time.time())
+
+
+def retry_delay(status, headers, attempt):
+    """Get the number of seconds to wait before retrying a request, or
+    ``None`` if the response should not be retried.
+
+    Rate limited responses are retried up to ``gw2api.max_retries`` times,
+    with exponential backoff and jitter. A ``Retry-After`` header is used as
+    the minimum delay.
+    """
+    if status != 429:
+        return None
+
+    record("rate_limited")
+    if attempt >= gw2api.max_retries:
+        return None
+
+    backoff = gw2api.retry_backoff * 2 ** attempt
+    delay = random.uniform(backoff / 2, backoff)
+    retry_after = parse_retry_after(headers.get("retry-after"))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+
+    record("retries")
+    record("retry_wait_time", delay)
+    return delay
+
+
+def get(transport, url, **kwargs):
+    """Send a GET request using ``transport``, waiting for the rate limiters
+    first and retrying rate limited requests.
+    """
+    key = api_key(kwargs)
+    attempt = 0
+    while True:
+        delay = reserve(key)
+        if delay:
+            time.sleep(delay)
+
+        r = transport.get(url, **kwargs)
+
+        delay = retry_delay(r.status_code, r.headers, attempt)
+        if delay is None:
+            return r
+        r.close()
+        time.sleep(delay)
+        attempt += 1
@@ -0,0 +1,71 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+__all__ = ("Transport", )
+
+
+class Transport(object):
+    """Send API requests over a pool of keep-alive connections.
+
+    Every thread gets its own :class:`requests.Session`, so cookies and other
+    session state are never shared between threads, but all sessions send
+    their requests through the same connection pool.
+
+    :param pool_connections: the number of hosts to keep connection pools for
+    :param pool_maxsize: the maximum number of connections to keep open per
+                         host. This should be at least the number of threads
+                         making requests, or connections are discarded after
+                         use.
+    :param pool_block: wait for a connection to become available instead of
+                       opening a new one when the pool is full
+    :param timeout: the default timeout of requests in seconds, either a
+                    single number or a ``(connect, read)`` tuple, or ``None``
+                    to wait forever
+    :param keep_alive: keep connections open after a request
+    :param session: send all requests with this session (or any object with
+                    a compatible ``get`` method) instead, in all threads. The
+                    pool options do not apply to it.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=32, pool_block=False,
+                 timeout=(5, 30), keep_alive=True, session=None):
+        super(Transport, self).__init__()
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.session = session
+        self.adapter = HTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   pool_block=pool_block)
+        self.local = threading.local()
+
+    def get_session(self):
+        """Get the session to use in the current thread.
+        """
+        if self.session is not None:
+            return self.session
+
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            if not self.keep_alive:
+                session.headers["Connection"] = "close"
+            self.local.session = session
+        return session
+
+    def get(self, url, **kwargs):
+        """Send a GET request, using the default timeout unless ``timeout`` is
+        given.
+        """
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        return self.get_session().get(url, **kwargs)
+
+    def close(self):
+        """Close all pooled connections.
+        """
+        self.adapter.close()
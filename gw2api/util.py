@@ -1,10 +1,10 @@
 import os
 import time
-import json
 from struct import pack, unpack
 from base64 import b64encode, b64decode
 
 import gw2api
+from . import ratelimit
 
 
 __all__ = ("encode_item_link", "encode_coin_link",
@@ -24,17 +24,30 @@ def get_cached(path, cache_name=None, **kwargs):
     """Request a resource form the API, first checking if there is a cached
     response available. Returns the parsed JSON data.
     """
-    if gw2api.cache_dir and gw2api.cache_time and cache_name is not False:
+    cache = gw2api.cache_backend
+    cache_time = gw2api.get_cache_time(path)
+    if cache is not None and cache_time and cache_name is not False:
         if cache_name is None:
             cache_name = path
-        cache_file = os.path.join(gw2api.cache_dir, cache_name)
-        if mtime(cache_file) >= time.time() - gw2api.cache_time:
-            with open(cache_file, "r") as fp:
-                return json.load(fp)
-    else:
-        cache_file = None
+        entry = cache.get(cache_name)
+        if entry is not None and entry.is_fresh(cache_time):
+            return entry.value
+
+        with cache.locked(cache_name):
+            # Another process may have refreshed the entry while we waited.
+            entry = cache.get(cache_name)
+            if entry is not None and entry.is_fresh(cache_time):
+                return entry.value
+            return request(path, cache, cache_name, cache_time, kwargs)
+
+    return request(path, None, None, None, kwargs)
 
-    r = gw2api.session.get(gw2api.BASE_URL + path, **kwargs)
+
+def request(path, cache, cache_name, cache_time, kwargs):
+    """Request a resource from the API and store the parsed JSON data in
+    ``cache``, unless it is ``None``.
+    """
+    r = ratelimit.get(gw2api.transport, gw2api.BASE_URL + path, **kwargs)
 
     if not r.ok:
         try:
@@ -47,9 +60,8 @@ def get_cached(path, cache_name=None, **kwargs):
     r.raise_for_status()
     data = r.json()
 
-    if cache_file:
-        with open(cache_file, "w") as fp:
-            json.dump(data, fp, indent=2)
+    if cache is not None:
+        cache.set(cache_name, data, expires=time.time() + cache_time)
 
     return data
 
@@ -22,67 +22,69 @@ from .pvp import PvpSeasonEndpoint
 
 
 build = BuildEndpoint("build")
-colors = LocaleAwareEndpoint("colors")
+colors = LocaleAwareEndpoint("colors", versioned=True)
 exchange = Endpoint("commerce/exchange")
-listings = Endpoint("commerce/listings")
-prices = Endpoint("commerce/prices")
-continents = LocaleAwareEndpoint("continents")
+listings = Endpoint("commerce/listings", supports_all=False)
+prices = Endpoint("commerce/prices", supports_all=False)
+continents = LocaleAwareEndpoint("continents", versioned=True)
 events = LocaleAwareEndpoint("events")
 events_state = Endpoint("events-state")
-files = Endpoint("files")
-floors = LocaleAwareEndpoint("floors")
-items = LocaleAwareEndpoint("items")
+files = Endpoint("files", versioned=True)
+floors = LocaleAwareEndpoint("floors", versioned=True)
+items = LocaleAwareEndpoint("items", versioned=True, supports_all=False)
 leaderboards = Endpoint("leaderboards")
-maps = LocaleAwareEndpoint("maps")
-quaggans = Endpoint("quaggans")
-recipes = Endpoint("recipes")
+maps = LocaleAwareEndpoint("maps", versioned=True)
+quaggans = Endpoint("quaggans", versioned=True)
+recipes = Endpoint("recipes", versioned=True, supports_all=False)
 recipe_search = RecipeSearchEndpoint(recipes)
-skins = LocaleAwareEndpoint("skins")
-specializations = LocaleAwareEndpoint("specializations")
-traits = LocaleAwareEndpoint("traits")
+skins = LocaleAwareEndpoint("skins", versioned=True, supports_all=False)
+specializations = LocaleAwareEndpoint("specializations", versioned=True)
+traits = LocaleAwareEndpoint("traits", versioned=True)
 worlds = LocaleAwareEndpoint("worlds")
 wvw_matches = WvwMatchesEndpoint("wvw/matches")
 wvw_matches_overview = WvwMatchesEndpoint("wvw/matches/overview")
 wvw_matches_scores = WvwMatchesEndpoint("wvw/matches/scores")
 wvw_matches_stats = WvwMatchStatsEndpoint("wvw/matches/stats")
-wvw_objectives = LocaleAwareEndpoint("wvw/objectives")
-wvw_abilities = LocaleAwareEndpoint("wvw/abilities")
-wvw_ranks = LocaleAwareEndpoint("wvw/ranks")
-wvw_upgrades = LocaleAwareEndpoint("wvw/upgrades")
-materials = LocaleAwareEndpoint("materials")
-currencies = LocaleAwareEndpoint("currencies")
+wvw_objectives = LocaleAwareEndpoint("wvw/objectives", versioned=True)
+wvw_abilities = LocaleAwareEndpoint("wvw/abilities", versioned=True)
+wvw_ranks = LocaleAwareEndpoint("wvw/ranks", versioned=True)
+wvw_upgrades = LocaleAwareEndpoint("wvw/upgrades", versioned=True)
+materials = LocaleAwareEndpoint("materials", versioned=True)
+currencies = LocaleAwareEndpoint("currencies", versioned=True)
 achievements = AchievementEndpoint("achievements")
-achievement_categories = LocaleAwareEndpoint("achievements/categories")
-achievement_groups = LocaleAwareEndpoint("achievements/groups")
-minis = LocaleAwareEndpoint("minis")
-emblem_foregrounds = Endpoint("emblem/foregrounds")
-emblem_backgrounds = Endpoint("emblem/backgrounds")
-guild_upgrades = LocaleAwareEndpoint("guild/upgrades")
-guild_permissions = LocaleAwareEndpoint("guild/permissions")
-skills = LocaleAwareEndpoint("skills")
+achievement_categories = LocaleAwareEndpoint("achievements/categories",
+                                             versioned=True)
+achievement_groups = LocaleAwareEndpoint("achievements/groups", versioned=True)
+minis = LocaleAwareEndpoint("minis", versioned=True)
+emblem_foregrounds = Endpoint("emblem/foregrounds", versioned=True)
+emblem_backgrounds = Endpoint("emblem/backgrounds", versioned=True)
+guild_upgrades = LocaleAwareEndpoint("guild/upgrades", versioned=True)
+guild_permissions = LocaleAwareEndpoint("guild/permissions", versioned=True)
+skills = LocaleAwareEndpoint("skills", versioned=True)
 pvp_seasons = PvpSeasonEndpoint("pvp/seasons")
-pvp_amulets = LocaleAwareEndpoint("pvp/amulets")
-pvp_ranks = LocaleAwareEndpoint("pvp/ranks")
-pvp_heroes = LocaleAwareEndpoint("pvp/heroes")
-professions = LocaleAwareEndpoint("professions")
-legends = Endpoint("legends")
-pets = LocaleAwareEndpoint("pets")
-item_stats = LocaleAwareEndpoint("itemstats")
-titles = LocaleAwareEndpoint("titles")
-backstory_questions = LocaleAwareEndpoint("backstory/questions")
-backstory_answers = LocaleAwareEndpoint("backstory/answers")
-finishers = LocaleAwareEndpoint("finishers")
-masteries = LocaleAwareEndpoint("masteries")
-stories = LocaleAwareEndpoint("stories")
-story_seasons = LocaleAwareEndpoint("stories/seasons")
-outfits = LocaleAwareEndpoint("outfits")
-dungeons = LocaleAwareEndpoint("dungeons")
-raids = LocaleAwareEndpoint("raids")
-races = LocaleAwareEndpoint("races")
-gliders = LocaleAwareEndpoint("gliders")
-mail_carriers = LocaleAwareEndpoint("mailcarriers")
-nodes = Endpoint("nodes")
-cats = Endpoint("cats")
+pvp_amulets = LocaleAwareEndpoint("pvp/amulets", versioned=True)
+pvp_ranks = LocaleAwareEndpoint("pvp/ranks", versioned=True)
+pvp_heroes = LocaleAwareEndpoint("pvp/heroes", versioned=True)
+professions = LocaleAwareEndpoint("professions", versioned=True)
+legends = Endpoint("legends", versioned=True)
+pets = LocaleAwareEndpoint("pets", versioned=True)
+item_stats = LocaleAwareEndpoint("itemstats", versioned=True)
+titles = LocaleAwareEndpoint("titles", versioned=True)
+backstory_questions = LocaleAwareEndpoint("backstory/questions",
+                                          versioned=True)
+backstory_answers = LocaleAwareEndpoint("backstory/answers", versioned=True)
+finishers = LocaleAwareEndpoint("finishers", versioned=True)
+masteries = LocaleAwareEndpoint("masteries", versioned=True)
+stories = LocaleAwareEndpoint("stories", versioned=True)
+story_seasons = LocaleAwareEndpoint("stories/seasons", versioned=True)
+outfits = LocaleAwareEndpoint("outfits", versioned=True)
+dungeons = LocaleAwareEndpoint("dungeons", versioned=True)
+raids = LocaleAwareEndpoint("raids", versioned=True)
+races = LocaleAwareEndpoint("races", versioned=True)
+gliders = LocaleAwareEndpoint("gliders", versioned=True)
+mail_carriers = LocaleAwareEndpoint("mailcarriers", versioned=True)
+nodes = Endpoint("nodes", versioned=True)
+cats = Endpoint("cats", versioned=True)
 
 account = AccountEndpoint("account")
 token_info = TokenInfoEndpoint("tokeninfo")
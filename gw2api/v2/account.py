@@ -8,12 +8,12 @@ class AuthenticatedMixin(object):
     def set_token(token):
         AuthenticatedMixin.token = token
 
-    def _get(self, path, **kwargs):
+    def prepare_request(self, kwargs):
         token = kwargs.pop("token") if "token" in kwargs else self.token
         if token:
             headers = kwargs.setdefault("headers", {})
             headers.setdefault("Authorization", "Bearer " + token)
-        return super(AuthenticatedMixin, self)._get(path, **kwargs)
+        return super(AuthenticatedMixin, self).prepare_request(kwargs)
 
 
 class AuthenticatedEndpoint(AuthenticatedMixin, Endpoint):
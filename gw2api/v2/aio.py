@@ -0,0 +1,559 @@
+"""Asynchronous versions of the v2 endpoints, for use with asyncio.
+
+Every endpoint instance in :mod:`gw2api.v2` has a counterpart with the same
+name in this module. The methods have the same names and arguments, but
+return awaitables::
+
+    import gw2api.v2.aio
+
+    async def main():
+        items = await gw2api.v2.aio.items.get([30684, 30685])
+        ...
+
+Requests are made through a shared :class:`aiohttp.ClientSession`, so aiohttp
+must be installed (``pip install gw2api[async]``). Responses are cached in the
+same cache backend as the synchronous endpoints.
+"""
+import asyncio
+import logging
+import itertools
+import collections
+
+from requests import HTTPError
+from requests.utils import parse_header_links
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+import gw2api
+import gw2api.v2
+from gw2api import ratelimit
+from .endpoint import EndpointBase, Endpoint, LocaleAwareEndpoint, \
+    BuildEndpoint, NOT_MODIFIED, is_rejected, error_status, build_tracker
+from .account import AuthenticatedEndpoint, AccountAchievementsEndpoint, \
+    AccountEndpoint, TokenInfoEndpoint, CharacterEndpoint, PvpStatsEndpoint, \
+    GuildEndpoint
+from .achievements import AchievementEndpoint
+from .pvp import PvpSeasonLeaderboardEndpoint, PvpSeasonEndpoint
+from .recipes import RecipeSearchEndpoint
+from .transactions import TransactionEndpoint
+from .util import ListWrapper, JsonArrayDecoder, unique
+from .wvw import WvwMatchesEndpoint, WvwMatchStatsEndpoint
+
+
+logger = logging.getLogger(__name__)
+
+session = None
+connection_limit = 100
+request_errors = (HTTPError, OSError, asyncio.TimeoutError)
+if aiohttp is not None:
+    request_errors += (aiohttp.ClientError, )
+refreshes = {}
+in_flight = {}
+
+
+def set_session(sess):
+    """Set the aiohttp.ClientSession to use for asynchronous API requests.
+    """
+    global session
+    session = sess
+
+
+def get_session():
+    """Get the session used for asynchronous API requests. A session with a
+    pool of at most ``connection_limit`` connections is created when none was
+    set. This must be called while the event loop is running.
+    """
+    global session
+    if session is None:
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for asynchronous requests")
+        connector = aiohttp.TCPConnector(limit=connection_limit)
+        session = aiohttp.ClientSession(connector=connector)
+    return session
+
+
+async def close():
+    """Close the session created by :func:`get_session`.
+    """
+    global session
+    if session is not None:
+        await session.close()
+        session = None
+
+
+def refresh_in_background(key, coroutine):
+    """Run ``coroutine`` as a task, unless a task for ``key`` is pending.
+    """
+    if key in refreshes:
+        coroutine.close()
+        return
+
+    def done(task):
+        del refreshes[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background refresh of %s failed", key,
+                         exc_info=task.exception())
+
+    refreshes[key] = asyncio.ensure_future(coroutine)
+    refreshes[key].add_done_callback(done)
+
+
+def coalesce(key, func):
+    """Run the coroutine returned by ``func`` as a task, unless a task for
+    ``key`` is pending. Returns an awaitable for the result of the task.
+    """
+    if key not in in_flight:
+        in_flight[key] = asyncio.ensure_future(func())
+        in_flight[key].add_done_callback(lambda task: in_flight.pop(key))
+    return asyncio.shield(in_flight[key])
+
+
+async def check_build():
+    """Request the current build if :data:`build_tracker` is due for a check,
+    without blocking the event loop.
+    """
+    if gw2api.build_check_interval is None or not build_tracker.needs_check():
+        return
+
+    build_id = None
+    try:
+        build_id = await build_endpoint.get()
+    except request_errors:
+        # Keep using the last known build.
+        pass
+    build_tracker.update(build_id)
+
+
+async def prefetch_tasks(func, items, prefetch):
+    """Like :func:`gw2api.v2.util.prefetch_map`, for coroutine functions:
+    yield the results of ``func`` for every item in order, running at most
+    ``prefetch`` calls as tasks ahead of the result that is consumed.
+    """
+    items = iter(items)
+    if prefetch < 1:
+        for item in items:
+            yield await func(item)
+        return
+
+    pending = collections.deque(
+        asyncio.ensure_future(func(item))
+        for item in itertools.islice(items, prefetch))
+    try:
+        while pending:
+            result = await pending.popleft()
+            for item in itertools.islice(items, 1):
+                pending.append(asyncio.ensure_future(func(item)))
+            yield result
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class Request(object):
+    """Send a request in an ``async with`` block, waiting for the rate limit
+    and retrying rate limited requests. The block gets the response.
+    """
+
+    def __init__(self, url, kwargs):
+        super(Request, self).__init__()
+        self.url = url
+        self.kwargs = kwargs
+        self.context = None
+
+    async def __aenter__(self):
+        key = ratelimit.api_key(self.kwargs)
+        attempt = 0
+        while True:
+            delay = ratelimit.reserve(key)
+            if delay:
+                await asyncio.sleep(delay)
+
+            self.context = get_session().get(self.url, **self.kwargs)
+            r = await self.context.__aenter__()
+            delay = ratelimit.retry_delay(r.status, r.headers, attempt)
+            if delay is None:
+                return r
+
+            await self.context.__aexit__(None, None, None)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return await self.context.__aexit__(exc_type, exc_value, traceback)
+
+
+def raise_for_status(status, reason, url):
+    if 400 <= status < 500:
+        kind = "Client Error"
+    elif 500 <= status < 600:
+        kind = "Server Error"
+    else:
+        return
+    error = HTTPError("%s %s: %s for url: %s" % (status, kind, reason, url))
+    error.status_code = status
+    error.reason = reason
+    raise error
+
+
+class AsyncMixin(object):
+    def get_build_id(self):
+        # Only the last known build is used here, the build is checked by
+        # check_build() before the cache is read.
+        if self.versioned and gw2api.build_check_interval is not None:
+            return build_tracker.build_id
+        return None
+
+    async def get_cached(self, path, cache_name, **kwargs):
+        if self.versioned:
+            await check_build()
+
+        entry = self.load_entry(cache_name)
+        if entry is not None:
+            if self.is_fresh(entry):
+                return self.make_cached_response(entry)
+
+            if self.can_serve_stale(entry):
+                refresh_in_background(cache_name, self.fetch_cached(
+                    path, cache_name, entry, kwargs))
+                return self.make_cached_response(entry)
+
+        return await self.fetch_cached(path, cache_name, entry, kwargs)
+
+    async def fetch_cached(self, path, cache_name, entry, kwargs):
+        async def fetch():
+            meta, data = await self._get(
+                path, **self.add_validators(kwargs, entry))
+
+            if data is NOT_MODIFIED:
+                self.touch_cached(cache_name)
+                return entry.value["meta"], entry.value["data"]
+
+            self.store_cached(cache_name, meta, data)
+            return meta, data
+
+        meta, data = await coalesce(self.request_key(path, kwargs), fetch)
+        return self.make_response(data, meta)
+
+    def send(self, path, **kwargs):
+        """Get a :class:`Request` for ``path``, to use with ``async with``.
+        """
+        kwargs = self.prepare_request(kwargs)
+        return Request(gw2api.v2.BASE_URL + path, kwargs)
+
+    async def _get(self, path, **kwargs):
+        request = self.send(path, **kwargs)
+        async with request as r:
+            return await self.read_response(r, request.url)
+
+    async def read_response(self, r, url):
+        if r.status == 304:
+            return self.get_metadata(r), NOT_MODIFIED
+
+        try:
+            response = await r.json(content_type=None)
+        except ValueError:  # pragma: no cover
+            response = None
+
+        reason = r.reason
+        if isinstance(response, dict) and "text" in response:
+            reason = response["text"]
+        raise_for_status(r.status, reason, url)
+
+        return self.get_metadata(r), response
+
+    def get_metadata(self, r):
+        links = {}
+        for link in parse_header_links(r.headers.get("link", "")):
+            if "rel" in link:
+                links[link["rel"]] = link
+        return self.make_metadata(links, r.headers)
+
+    async def get_entities(self, ids, cache_prefix, params):
+        if self.versioned:
+            await check_build()
+
+        ids, cache_names, entities = self.load_entities(ids, cache_prefix)
+
+        def fetch(chunk):
+            kwargs = {"params": dict(params, ids=",".join(chunk))}
+
+            async def fetch_chunk():
+                meta, data = await self._get(self.name, **kwargs)
+                self.store_entities(cache_names, data)
+                return meta, data
+
+            return coalesce(self.request_key(self.name, kwargs), fetch_chunk)
+
+        chunks = self.missing_chunks(ids, entities)
+        responses = await asyncio.gather(*[fetch(chunk) for chunk in chunks])
+        return self.merge_entities(ids, entities, responses)
+
+    async def fetch_ids(self):
+        meta, data = await self._get(self.name)
+        return data
+
+    async def fetch_many(self, ids, params=None):
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def fetch(chunk):
+            async with semaphore:
+                return await self.fetch_chunk(chunk, params)
+
+        chunks = self.missing_chunks(unique(ids), {})
+        responses = await asyncio.gather(*[fetch(chunk) for chunk in chunks])
+        return [entity for data in responses for entity in data]
+
+    async def fetch_chunk(self, ids, params=None):
+        kwargs = {"params": dict(params or {}, ids=",".join(ids))}
+        try:
+            meta, data = await self._get(self.name, **kwargs)
+        except HTTPError as e:
+            if error_status(e) != 404:
+                raise
+            return []
+        return data
+
+    async def get_all_or_many(self, get_all, get_many):
+        if self.supports_all is not False:
+            try:
+                return await get_all()
+            except HTTPError as e:
+                if not is_rejected(e):
+                    raise
+                self.supports_all = False
+
+        return await get_many(await self.get_ids())
+
+    async def iter_all_or_many(self, cache_prefix, params, get_many):
+        if self.supports_all is not False:
+            try:
+                async for entity in self.iter_entities(cache_prefix, params):
+                    yield entity
+                return
+            except HTTPError as e:
+                if not is_rejected(e):
+                    raise
+                self.supports_all = False
+
+        ids = await self.get_ids()
+        chunks = [ids[i:i + self.max_ids]
+                  for i in range(0, len(ids), self.max_ids)]
+        async for data in prefetch_tasks(get_many, chunks, self.max_workers):
+            for entity in data:
+                yield entity
+
+    async def iter_entities(self, cache_prefix, params):
+        if self.versioned:
+            await check_build()
+
+        request = self.send(self.name, params=params)
+        async with request as r:
+            if r.status >= 400:
+                await self.read_response(r, request.url)
+
+            decoder = JsonArrayDecoder()
+            batch = []
+            chunks = r.content.iter_chunked(self.stream_chunk_size)
+            done = False
+            while not done:
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    chunk, done = b"", True
+                for entity in decoder.feed(chunk, done):
+                    batch.append(entity)
+                    if len(batch) == self.max_ids:
+                        self.store_batch(cache_prefix, batch)
+                        batch = []
+                    yield entity
+            self.store_batch(cache_prefix, batch)
+
+    async def get_all_pages(self, *args, **kwargs):
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def fetch(page):
+            async with semaphore:
+                return await self.page(page, self.max_page_size, *args,
+                                       **kwargs)
+
+        first = await fetch(0)
+        total = (first.meta or {}).get("page_total", 1)
+        pages = await asyncio.gather(*[fetch(page)
+                                       for page in range(1, total)])
+        return self.merge_pages([first] + list(pages))
+
+    async def iter_pages(self, *args, **kwargs):
+        prefetch = kwargs.pop("prefetch", 2)
+        first = await self.page(0, *args, **kwargs)
+        yield first
+
+        total = (first.meta or {}).get("page_total")
+        if total is None:
+            return
+
+        def fetch(number):
+            return self.page(number, *first.args)
+
+        async for page in prefetch_tasks(fetch, range(1, total), prefetch):
+            yield page
+
+    async def make_page(self, page, data, args):
+        return ListWrapper(self, page, await data, args=args)
+
+
+class AsyncEndpointBase(AsyncMixin, EndpointBase):
+    pass
+
+
+class AsyncEndpoint(AsyncMixin, Endpoint):
+    pass
+
+
+class AsyncLocaleAwareEndpoint(AsyncMixin, LocaleAwareEndpoint):
+    pass
+
+
+class AsyncBuildEndpoint(AsyncMixin, BuildEndpoint):
+    async def get(self):
+        build = await self.get_cached(self.name, None)
+        return build["id"]
+
+
+build_endpoint = AsyncBuildEndpoint("build")
+
+
+class AsyncAchievementEndpoint(AsyncMixin, AchievementEndpoint):
+    pass
+
+
+class AsyncRecipeSearchEndpoint(AsyncMixin, RecipeSearchEndpoint):
+    async def input(self, item_id, details=False):
+        recipe_ids = await super(AsyncRecipeSearchEndpoint, self).input(
+            item_id)
+        if details:
+            return await self.recipe_endpoint.get(recipe_ids)
+        return recipe_ids
+
+    async def output(self, item_id, details=False):
+        recipe_ids = await super(AsyncRecipeSearchEndpoint, self).output(
+            item_id)
+        if details:
+            return await self.recipe_endpoint.get(recipe_ids)
+        return recipe_ids
+
+
+class AsyncAuthenticatedEndpoint(AsyncMixin, AuthenticatedEndpoint):
+    pass
+
+
+class AsyncAccountAchievementsEndpoint(AsyncMixin,
+                                       AccountAchievementsEndpoint):
+    pass
+
+
+class AsyncAccountEndpoint(AsyncMixin, AccountEndpoint):
+    def __init__(self, name):
+        super(AsyncAccountEndpoint, self).__init__(name)
+        self.achievements = AsyncAccountAchievementsEndpoint(
+            name + "/achievements")
+
+
+class AsyncTokenInfoEndpoint(AsyncMixin, TokenInfoEndpoint):
+    pass
+
+
+class AsyncCharacterEndpoint(AsyncMixin, CharacterEndpoint):
+    async def get_character_field(self, id, suffix, field):
+        name = "%s/%s/%s" % (self.name, id, suffix)
+        response = await self.get_cached(name, None)
+        return response.get(field)
+
+    def get_crafting(self, id):
+        return self.get_character_field(id, "crafting", "crafting")
+
+    def get_inventory(self, id):
+        return self.get_character_field(id, "inventory", "bags")
+
+    def get_equipment(self, id):
+        return self.get_character_field(id, "equipment", "equipment")
+
+    def get_specializations(self, id):
+        return self.get_character_field(id, "specializations",
+                                        "specializations")
+
+    def get_recipes(self, id):
+        return self.get_character_field(id, "recipes", "recipes")
+
+    def get_backstory(self, id):
+        return self.get_character_field(id, "backstory", "backstory")
+
+    def get_training(self, id):
+        return self.get_character_field(id, "training", "training")
+
+    def get_skills(self, id):
+        return self.get_character_field(id, "skills", "skills")
+
+
+class AsyncPvpStatsEndpoint(AsyncMixin, PvpStatsEndpoint):
+    pass
+
+
+class AsyncGuildEndpoint(AsyncMixin, GuildEndpoint):
+    pass
+
+
+class AsyncTransactionEndpoint(AsyncMixin, TransactionEndpoint):
+    pass
+
+
+class AsyncWvwMatchesEndpoint(AsyncMixin, WvwMatchesEndpoint):
+    pass
+
+
+class AsyncWvwMatchStatsEndpoint(AsyncMixin, WvwMatchStatsEndpoint):
+    pass
+
+
+class AsyncPvpSeasonLeaderboardEndpoint(AsyncMixin,
+                                        PvpSeasonLeaderboardEndpoint):
+    pass
+
+
+class AsyncPvpSeasonEndpoint(AsyncMixin, PvpSeasonEndpoint):
+    def get_leaderboard_endpoint(self, season_id, board, region=None):
+        endpoint = super(AsyncPvpSeasonEndpoint, self) \
+            .get_leaderboard_endpoint(season_id, board, region)
+        return AsyncPvpSeasonLeaderboardEndpoint(endpoint.name)
+
+
+async_types = {
+    EndpointBase: AsyncEndpointBase,
+    Endpoint: AsyncEndpoint,
+    LocaleAwareEndpoint: AsyncLocaleAwareEndpoint,
+    BuildEndpoint: AsyncBuildEndpoint,
+    AchievementEndpoint: AsyncAchievementEndpoint,
+    AuthenticatedEndpoint: AsyncAuthenticatedEndpoint,
+    AccountEndpoint: AsyncAccountEndpoint,
+    TokenInfoEndpoint: AsyncTokenInfoEndpoint,
+    CharacterEndpoint: AsyncCharacterEndpoint,
+    PvpStatsEndpoint: AsyncPvpStatsEndpoint,
+    GuildEndpoint: AsyncGuildEndpoint,
+    TransactionEndpoint: AsyncTransactionEndpoint,
+    WvwMatchesEndpoint: AsyncWvwMatchesEndpoint,
+    WvwMatchStatsEndpoint: AsyncWvwMatchStatsEndpoint,
+    PvpSeasonEndpoint: AsyncPvpSeasonEndpoint,
+}
+
+# Create an asynchronous counterpart for every endpoint in gw2api.v2.
+for _name, _endpoint in list(vars(gw2api.v2).items()):
+    if type(_endpoint) in async_types:
+        globals()[_name] = async_types[type(_endpoint)](_endpoint.name)
+        globals()[_name].versioned = _endpoint.versioned
+        if isinstance(_endpoint, Endpoint):
+            globals()[_name].supports_all = _endpoint.supports_all
+del _name, _endpoint
+
+recipe_search = AsyncRecipeSearchEndpoint(globals()["recipes"])
@@ -0,0 +1,395 @@
+"""Resolve crafting trees from recipes.
+
+A :class:`RecipeGraph` indexes recipes by the item they produce. It can be
+loaded in bulk, or fill itself with the recipes needed for a tree, one level
+of the tree at a time::
+
+    graph = RecipeGraph()
+    graph.load()
+    tree = graph.resolve(30684)
+    materials = graph.materials(30684)
+
+A :class:`CostOptimizer` computes the cheapest way to obtain every item of a
+graph, buying it or crafting it, from one snapshot of trading post prices::
+
+    optimizer = CostOptimizer(graph)
+    optimizer.refresh()
+    print(optimizer.cost(30684), optimizer.source(30684))
+"""
+import heapq
+from array import array
+
+import gw2api.v2
+
+from .util import parallel_map
+
+
+__all__ = ("RecipeGraph", "CostOptimizer")
+
+
+class RecipeGraph(object):
+    """An index of recipes by output item, with memoized crafting trees.
+
+    :param recipes: recipes to add to the graph
+    :param recipe_endpoint: the endpoint to request recipes from, defaults
+                            to :data:`gw2api.v2.recipes`
+    :param search_endpoint: the endpoint to find the recipes for an item
+                            with, defaults to :data:`gw2api.v2.recipe_search`
+
+    When several recipes produce the same item, the one with the lowest id
+    is used for crafting trees.
+    """
+
+    def __init__(self, recipes=(), recipe_endpoint=None, search_endpoint=None):
+        super(RecipeGraph, self).__init__()
+        self.recipe_endpoint = recipe_endpoint or gw2api.v2.recipes
+        self.search_endpoint = search_endpoint or gw2api.v2.recipe_search
+        self.recipes = {}
+        self.by_output = {}
+        self.searched = set()
+        self.complete = False
+        self.trees = {}
+        for recipe in recipes:
+            self.add(recipe)
+
+    def add(self, recipe):
+        """Add a recipe to the graph.
+        """
+        if recipe["id"] in self.recipes:
+            return
+        self.recipes[recipe["id"]] = recipe
+        recipes = self.by_output.setdefault(recipe["output_item_id"], [])
+        recipes.append(recipe)
+        recipes.sort(key=lambda recipe: recipe["id"])
+        self.trees.clear()
+
+    def load(self):
+        """Add all recipes. Trees are resolved without further requests
+        afterwards.
+        """
+        for recipe in self.recipe_endpoint.iter_all():
+            self.add(recipe)
+        self.complete = True
+
+    def recipes_for(self, item_id):
+        """Get the recipes that produce ``item_id``.
+        """
+        return self.by_output.get(item_id, [])
+
+    def recipe_for(self, item_id):
+        recipes = self.recipes_for(item_id)
+        return recipes[0] if recipes else None
+
+    def fetch(self, item_ids):
+        """Request the recipes for the items that were not searched before:
+        the searches are made in parallel, followed by a single request for
+        all recipes that are not in the graph yet.
+        """
+        item_ids = [item_id for item_id in item_ids
+                    if item_id not in self.searched]
+        if self.complete or not item_ids:
+            return
+
+        results = parallel_map(self.search_endpoint.output, item_ids,
+                               self.recipe_endpoint.max_workers)
+        recipe_ids = set(recipe_id for recipe_ids in results
+                         for recipe_id in recipe_ids
+                         if recipe_id not in self.recipes)
+        if recipe_ids:
+            for recipe in self.recipe_endpoint.get(sorted(recipe_ids)):
+                self.add(recipe)
+        self.searched.update(item_ids)
+
+    def prepare(self, item_ids):
+        """Make sure the recipes for all items in the crafting trees of
+        ``item_ids`` are in the graph, fetching the missing recipes level by
+        level.
+        """
+        level = set(item_ids)
+        seen = set()
+        while level:
+            self.fetch(sorted(level))
+            seen |= level
+            level = set(ingredient["item_id"]
+                        for item_id in level
+                        for recipe in self.recipes_for(item_id)[:1]
+                        for ingredient in recipe["ingredients"]) - seen
+
+    def resolve(self, item_id):
+        """Get the crafting tree for one craft of ``item_id``::
+
+            {"item_id": 19721, "recipe": {...}, "output_count": 1,
+             "ingredients": [(count, subtree), ...]}
+
+        Items that cannot be crafted have no ``recipe``, an ``output_count``
+        of 1 and no ``ingredients``. Trees are memoized and shared between
+        the trees they are part of, so they should not be modified.
+        """
+        self.prepare([item_id])
+        return self.build_tree(item_id, set())
+
+    def build_tree(self, item_id, path):
+        if item_id in self.trees:
+            return self.trees[item_id]
+
+        recipe = self.recipe_for(item_id)
+        if recipe is None or item_id in path:
+            # Recipe cycles are broken by treating the item as a material.
+            return {"item_id": item_id, "recipe": None, "output_count": 1,
+                    "ingredients": []}
+
+        path = path | set([item_id])
+        tree = {
+            "item_id": item_id,
+            "recipe": recipe,
+            "output_count": recipe.get("output_item_count", 1),
+            "ingredients": [
+                (ingredient["count"],
+                 self.build_tree(ingredient["item_id"], path))
+                for ingredient in recipe["ingredients"]],
+        }
+        self.trees[item_id] = tree
+        return tree
+
+    def materials(self, item_id, count=1):
+        """Get the raw materials needed to craft ``count`` of ``item_id``, as
+        a dictionary of item ids and counts. Crafts that produce more than
+        one item are rounded up.
+        """
+        tree = self.resolve(item_id)
+        materials = {}
+
+        def add(tree, count):
+            if not tree["ingredients"]:
+                materials[tree["item_id"]] = \
+                    materials.get(tree["item_id"], 0) + count
+                return
+            crafts = -(-count // tree["output_count"])
+            for ingredient_count, subtree in tree["ingredients"]:
+                add(subtree, crafts * ingredient_count)
+
+        add(tree, count)
+        return materials
+
+
+class CostOptimizer(object):
+    """Compute the cheapest way to obtain every item of a
+    :class:`RecipeGraph`: buying it on the trading post or crafting it from
+    the cheapest ingredients.
+
+    The items are ordered once so that ingredients come before the items
+    they are used for, and all prices, costs and recipes are kept in arrays
+    indexed by that order. A full computation is a single pass over the
+    arrays. :meth:`update_prices` only recomputes the items whose price
+    changed and the items depending on them.
+
+    Recipes that take part in a cycle are left out. Costs are in copper per
+    item, items that can neither be bought nor crafted cost ``inf``.
+
+    :param graph: the :class:`RecipeGraph` with the recipes to use
+    :param price_endpoint: the endpoint to request prices from, defaults
+                           to :data:`gw2api.v2.prices`
+    :param side: ``"sells"`` to buy items from the lowest sell listing,
+                 ``"buys"`` to buy them with buy orders
+    """
+    BUY = -1
+
+    def __init__(self, graph, price_endpoint=None, side="sells"):
+        super(CostOptimizer, self).__init__()
+        self.graph = graph
+        self.price_endpoint = price_endpoint or gw2api.v2.prices
+        self.side = side
+        self.build()
+
+    def build(self):
+        """Index the recipes of the graph. Called again after recipes were
+        added to the graph, this resets all prices.
+        """
+        recipes = {}
+        for recipe in self.graph.recipes.values():
+            recipes.setdefault(recipe["output_item_id"], []).append(recipe)
+        for item_recipes in recipes.values():
+            item_recipes.sort(key=lambda recipe: recipe["id"])
+
+        self.ids = self.sort_items(recipes)
+        self.index = dict((item_id, i) for i, item_id in enumerate(self.ids))
+        count = len(self.ids)
+
+        # Recipes and their ingredients, in compressed sparse row layout:
+        # the recipes of item i are item_recipes[i]:item_recipes[i + 1], the
+        # ingredients of recipe r are ingredients[r]:ingredients[r + 1].
+        self.recipe_ids = array("l")
+        self.output_counts = array("l")
+        self.item_recipes = array("l", [0])
+        self.ingredients = array("l", [0])
+        self.ingredient_items = array("l")
+        self.ingredient_counts = array("l")
+        dependents = [[] for i in range(count)]
+
+        for i, item_id in enumerate(self.ids):
+            for recipe in recipes.get(item_id, ()):
+                positions = [self.index[ingredient["item_id"]]
+                             for ingredient in recipe["ingredients"]]
+                if any(position >= i for position in positions):
+                    # Part of a cycle.
+                    continue
+                self.recipe_ids.append(recipe["id"])
+                self.output_counts.append(recipe.get("output_item_count", 1))
+                for position, ingredient in zip(positions,
+                                                recipe["ingredients"]):
+                    self.ingredient_items.append(position)
+                    self.ingredient_counts.append(ingredient["count"])
+                    dependents[position].append(i)
+                self.ingredients.append(len(self.ingredient_items))
+            self.item_recipes.append(len(self.recipe_ids))
+
+        self.dependents = array("l", [0])
+        self.dependent_items = array("l")
+        for items in dependents:
+            self.dependent_items.extend(sorted(set(items)))
+            self.dependents.append(len(self.dependent_items))
+
+        self.prices = array("d", [float("inf")]) * count
+        self.costs = array("d", [float("inf")]) * count
+        self.choices = array("l", [self.BUY]) * count
+        self.compute_all()
+
+    def sort_items(self, recipes):
+        """Order all items of the recipes so ingredients come first.
+        """
+        items = set(recipes)
+        for item_recipes in recipes.values():
+            for recipe in item_recipes:
+                items.update(ingredient["item_id"]
+                             for ingredient in recipe["ingredients"])
+
+        order = []
+        visited = set()
+        for item_id in sorted(items):
+            if item_id in visited:
+                continue
+            visited.add(item_id)
+            stack = [(item_id, iter(self.ingredient_ids(recipes, item_id)))]
+            while stack:
+                current, ingredients = stack[-1]
+                for ingredient_id in ingredients:
+                    if ingredient_id not in visited:
+                        visited.add(ingredient_id)
+                        stack.append((ingredient_id, iter(
+                            self.ingredient_ids(recipes, ingredient_id))))
+                        break
+                else:
+                    stack.pop()
+                    order.append(current)
+        return order
+
+    def ingredient_ids(self, recipes, item_id):
+        return sorted(set(ingredient["item_id"]
+                          for recipe in recipes.get(item_id, ())
+                          for ingredient in recipe["ingredients"]))
+
+    def compute(self, i):
+        """Compute the cost of item ``i`` from the costs of its ingredients.
+        Returns whether the cost changed.
+        """
+        best, choice = self.prices[i], self.BUY
+        costs = self.costs
+        items, counts = self.ingredient_items, self.ingredient_counts
+        for r in range(self.item_recipes[i], self.item_recipes[i + 1]):
+            total = 0.0
+            for j in range(self.ingredients[r], self.ingredients[r + 1]):
+                total += counts[j] * costs[items[j]]
+            total /= self.output_counts[r]
+            if total < best:
+                best, choice = total, r
+
+        self.choices[i] = choice
+        if best == costs[i]:
+            return False
+        costs[i] = best
+        return True
+
+    def compute_all(self):
+        for i in range(len(self.ids)):
+            self.compute(i)
+
+    def price_value(self, price):
+        unit_price = price.get(self.side, {}).get("unit_price")
+        return float(unit_price) if unit_price else float("inf")
+
+    def set_prices(self, prices):
+        """Replace all prices with a snapshot of ``commerce/prices`` entries
+        and compute all costs. Items without a price can not be bought.
+        """
+        self.prices = array("d", [float("inf")]) * len(self.ids)
+        for price in prices:
+            i = self.index.get(price["id"])
+            if i is not None:
+                self.prices[i] = self.price_value(price)
+        self.compute_all()
+
+    def update_prices(self, prices):
+        """Update the prices of the items in ``prices`` and recompute the
+        costs that depend on them. Returns the ids of the items whose cost
+        changed.
+        """
+        queue = []
+        for price in prices:
+            i = self.index.get(price["id"])
+            if i is None:
+                continue
+            value = self.price_value(price)
+            if value != self.prices[i]:
+                self.prices[i] = value
+                queue.append(i)
+        heapq.heapify(queue)
+
+        # Dependents always come after their ingredients, so every item is
+        # computed once, after all of its changed ingredients.
+        changed = []
+        queued = set(queue)
+        while queue:
+            i = heapq.heappop(queue)
+            if not self.compute(i):
+                continue
+            changed.append(self.ids[i])
+            for j in range(self.dependents[i], self.dependents[i + 1]):
+                dependent = self.dependent_items[j]
+                if dependent not in queued:
+                    queued.add(dependent)
+                    heapq.heappush(queue, dependent)
+        return changed
+
+    def refresh(self):
+        """Request the current prices of all items in the graph, bypassing
+        the cache, and update the costs. Returns the ids of the items whose
+        cost changed.
+        """
+        prices = self.price_endpoint.fetch_many(self.ids)
+        seen = set(price["id"] for price in prices)
+        # Items that are no longer listed can not be bought anymore.
+        missing = [{"id": item_id} for item_id in self.ids
+                   if item_id not in seen]
+        return self.update_prices(prices + missing)
+
+    def cost(self, item_id):
+        """Get the cheapest cost of one ``item_id``, in copper.
+        """
+        return self.costs[self.index[item_id]]
+
+    def source(self, item_id):
+        """Get how ``item_id`` is obtained at the cheapest cost: ``"buy"``,
+        the recipe to craft it with, or ``None`` if it can not be obtained.
+        """
+        i = self.index[item_id]
+        if self.costs[i] == float("inf"):
+            return None
+        if self.choices[i] == self.BUY:
+            return "buy"
+        return self.graph.recipes[self.recipe_ids[self.choices[i]]]
+
+    def items(self):
+        """Get the cheapest cost of all items, as a dictionary of item ids
+        and costs.
+        """
+        return dict(zip(self.ids, self.costs))
@@ -1,13 +1,53 @@
-import os
-import time
+import re
 import json
-import collections
+import time
+import threading
+
+try:
+    from collections.abc import Iterable
+except ImportError:  # pragma: no cover
+    from collections import Iterable
 
 import six
+import requests
 
 import gw2api
-from .util import ListWrapper
-from ..util import mtime
+from gw2api import ratelimit
+from .util import ListWrapper, Refresher, SingleFlight, unique, \
+    parallel_map, prefetch_map, merge_meta, iter_json_array, iter_pages
+
+
+# Returned by _get instead of the data when a conditional request finds that
+# the cached response is still up to date.
+NOT_MODIFIED = object()
+
+# The reason the API gives when an endpoint does not support ids=all.
+ALL_NOT_SUPPORTED = re.compile(r"\ball\b.*supported", re.IGNORECASE)
+
+
+def error_status(error):
+    """Get the status code of the response that caused an
+    :class:`requests.HTTPError`.
+    """
+    status = getattr(error.response, "status_code", None)
+    return getattr(error, "status_code", status)
+
+
+def error_reason(error):
+    """Get the reason given by the API for an :class:`requests.HTTPError`.
+    """
+    reason = getattr(error.response, "reason", None)
+    return getattr(error, "reason", reason) or ""
+
+
+def is_rejected(error):
+    """Check whether an :class:`requests.HTTPError` was caused by the API
+    rejecting ``ids=all`` (``400 Bad Request`` with a reason such as "all ids
+    not supported"). Other errors are not mistaken for an endpoint that does
+    not support ``ids=all``.
+    """
+    return error_status(error) == 400 and \
+        ALL_NOT_SUPPORTED.search(error_reason(error)) is not None
 
 
 class ListResponse(list):
@@ -28,40 +68,190 @@ class EndpointBase(object):
         dict: DictResponse,
     }
 
-    def __init__(self, name):
+    versioned = False
+    cache_time = None
+
+    def __init__(self, name, versioned=None):
         super(EndpointBase, self).__init__()
         self.name = name
+        if versioned is not None:
+            self.versioned = versioned
+
+    def get_cache_time(self):
+        """Get the maximum lifetime of cached responses from this endpoint.
+        This is ``cache_time`` if it was set on the endpoint, or otherwise the
+        global cache time policy for the endpoint name.
+        """
+        if self.cache_time is not None:
+            return self.cache_time
+        return gw2api.get_cache_time(self.name)
+
+    def get_cache(self, cache_name):
+        """Get the cache backend to use for ``cache_name``, or ``None`` if the
+        response should not be cached.
+        """
+        if gw2api.cache_backend is not None and self.get_cache_time() and \
+                cache_name:
+            return gw2api.cache_backend
+        return None
+
+    def get_build_id(self):
+        """Get the current build id if responses from this endpoint are cached
+        until the game build changes, or ``None``.
+        """
+        if self.versioned and gw2api.build_check_interval is not None:
+            return build_tracker.get_build_id()
+        return None
+
+    def is_fresh(self, entry):
+        build_id = self.get_build_id()
+        if build_id is not None and "build" in entry.info:
+            return entry.info["build"] == build_id
+        return entry.is_fresh(self.get_cache_time())
+
+    def entry_options(self):
+        """Get the expiry metadata to store with a new cache entry.
+        """
+        build_id = self.get_build_id()
+        if build_id is not None:
+            return {"expires": None, "info": {"build": build_id}}
+        return {"expires": time.time() + self.get_cache_time(), "info": None}
 
     def has_cached(self, cache_name):
-        if gw2api.cache_dir and gw2api.cache_time and cache_name:
-            cache_file = os.path.join(gw2api.cache_dir, cache_name)
-            return mtime(cache_file) >= time.time() - gw2api.cache_time
-        else:
+        cache = self.get_cache(cache_name)
+        if cache is None:
             return False
+        elif self.versioned:
+            entry = cache.get(cache_name)
+            return entry is not None and self.is_fresh(entry)
+        else:
+            return cache.contains(cache_name, self.get_cache_time())
 
     def get_cached(self, path, cache_name, **kwargs):
         """Request a resource form the API, first checking if there is a cached
         response available. Returns the parsed JSON data.
+
+        When the cached response has expired, it is revalidated using the
+        ``ETag`` and ``Last-Modified`` headers of the original response. If
+        stale responses may be served (see
+        :func:`gw2api.set_stale_while_revalidate`), the expired response is
+        returned right away and revalidated in the background.
+
+        On a miss, the cache entry is locked while the response is requested
+        (see :meth:`gw2api.cache.CacheBackend.locked`), so processes sharing
+        the cache do not request the same resource at the same time.
         """
-        if gw2api.cache_dir and gw2api.cache_time and cache_name:
-            cache_file = os.path.join(gw2api.cache_dir, cache_name)
-            if mtime(cache_file) >= time.time() - gw2api.cache_time:
-                with open(cache_file, "r") as fp:
-                    tmp = json.load(fp)
-                return self.make_response(tmp["data"], tmp["meta"])
-        else:
-            cache_file = None
+        entry = self.load_entry(cache_name)
+        if entry is not None:
+            if self.is_fresh(entry):
+                return self.make_cached_response(entry)
+
+            if self.can_serve_stale(entry):
+                refresher.submit(cache_name, lambda: self.fetch_cached(
+                    path, cache_name, entry, kwargs))
+                return self.make_cached_response(entry)
+
+        cache = self.get_cache(cache_name)
+        if cache is None:
+            return self.fetch_cached(path, cache_name, entry, kwargs)
+
+        with cache.locked(cache_name):
+            # Another process may have refreshed the entry while we waited.
+            entry = self.load_entry(cache_name)
+            if entry is not None and self.is_fresh(entry):
+                return self.make_cached_response(entry)
+            return self.fetch_cached(path, cache_name, entry, kwargs)
+
+    def fetch_cached(self, path, cache_name, entry, kwargs):
+        """Request a resource and store it in the cache. ``entry`` is the
+        expired cache entry, if there is one.
+
+        Concurrent identical requests are coalesced: only the first thread
+        requests the resource, the others wait for its response.
+        """
+        def fetch():
+            meta, data = self._get(path, **self.add_validators(kwargs, entry))
 
-        meta, data = self._get(path, **kwargs)
+            if data is NOT_MODIFIED:
+                self.touch_cached(cache_name)
+                return entry.value["meta"], entry.value["data"]
 
-        if cache_file:
-            with open(cache_file, "w") as fp:
-                json.dump({"meta": meta, "data": data}, fp, indent=2)
+            self.store_cached(cache_name, meta, data)
+            return meta, data
 
+        meta, data = in_flight.call(self.request_key(path, kwargs), fetch)
         return self.make_response(data, meta)
 
+    def can_serve_stale(self, entry):
+        """Check whether an expired entry is recent enough to be returned while
+        it is being revalidated.
+        """
+        if gw2api.max_stale is None:
+            return False
+        now = time.time() - gw2api.max_stale
+        return entry.is_fresh(self.get_cache_time(), now)
+
+    def load_entry(self, cache_name):
+        """Get the cache entry for ``cache_name``, fresh or not, or ``None``.
+        """
+        cache = self.get_cache(cache_name)
+        return cache.get(cache_name) if cache is not None else None
+
+    def make_cached_response(self, entry):
+        return self.make_response(entry.value["data"], entry.value["meta"])
+
+    def add_validators(self, kwargs, entry):
+        """Make the request conditional on the cached response having
+        changed, if the response included validators.
+        """
+        if entry is None:
+            return kwargs
+
+        meta = entry.value["meta"]
+        headers = dict(kwargs.get("headers") or {})
+        if "etag" in meta:
+            headers["If-None-Match"] = meta["etag"]
+        if "last_modified" in meta:
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return dict(kwargs, headers=headers) if headers else kwargs
+
+    def store_cached(self, cache_name, meta, data):
+        cache = self.get_cache(cache_name)
+        if cache is not None:
+            cache.set(cache_name, {"meta": meta, "data": data},
+                      **self.entry_options())
+
+    def touch_cached(self, cache_name):
+        cache = self.get_cache(cache_name)
+        if cache is not None:
+            cache.touch(cache_name, **self.entry_options())
+
+    def request_key(self, path, kwargs):
+        """Get a key that is equal for identical requests.
+        """
+        kwargs = dict(kwargs)
+        if "headers" in kwargs:
+            kwargs["headers"] = dict(kwargs["headers"] or {})
+        kwargs = self.prepare_request(kwargs)
+        return path, json.dumps(kwargs, sort_keys=True, default=str)
+
+    def prepare_request(self, kwargs):
+        """Adjust the keyword arguments for a request before it is sent.
+        """
+        return kwargs
+
+    def send(self, path, **kwargs):
+        """Send a request to the API and return the response.
+        """
+        kwargs = self.prepare_request(kwargs)
+        return ratelimit.get(gw2api.transport, gw2api.v2.BASE_URL + path,
+                             **kwargs)
+
     def _get(self, path, **kwargs):
-        r = gw2api.session.get(gw2api.v2.BASE_URL + path, **kwargs)
+        r = self.send(path, **kwargs)
+
+        if r.status_code == 304:
+            return self.get_metadata(r), NOT_MODIFIED
 
         try:
             response = r.json()
@@ -76,19 +266,27 @@ class EndpointBase(object):
         return self.get_metadata(r), response
 
     def get_metadata(self, r):
+        return self.make_metadata(r.links, r.headers)
+
+    def make_metadata(self, links, headers):
         metadata = {}
 
-        for key, link in r.links.items():
+        for key, link in links.items():
             metadata[key] = link["url"]
 
-        if "x-page-total" in r.headers:
-            metadata["page_total"] = int(r.headers["x-page-total"])
-        if "x-page-size" in r.headers:
-            metadata["page_size"] = int(r.headers["x-page-size"])
-        if "x-result-total" in r.headers:
-            metadata["result_total"] = int(r.headers["x-result-total"])
-        if "x-result-count" in r.headers:
-            metadata["result_count"] = int(r.headers["x-result-count"])
+        if "x-page-total" in headers:
+            metadata["page_total"] = int(headers["x-page-total"])
+        if "x-page-size" in headers:
+            metadata["page_size"] = int(headers["x-page-size"])
+        if "x-result-total" in headers:
+            metadata["result_total"] = int(headers["x-result-total"])
+        if "x-result-count" in headers:
+            metadata["result_count"] = int(headers["x-result-count"])
+
+        if "etag" in headers:
+            metadata["etag"] = headers["etag"]
+        if "last-modified" in headers:
+            metadata["last_modified"] = headers["last-modified"]
 
         return metadata
 
@@ -96,29 +294,265 @@ class EndpointBase(object):
         response_type = self.response_types.get(type(data))
         return response_type(data, meta) if response_type else data
 
+    def make_page(self, page, data, args):
+        return ListWrapper(self, page, data, args=args)
+
+    def iter_pages(self, *args, **kwargs):
+        """Iterate over all pages, starting at the first one. The arguments
+        are passed on to :meth:`page`, except for ``prefetch``: the number of
+        pages to request in the background while the current page is being
+        processed (2 by default).
+        """
+        prefetch = kwargs.pop("prefetch", 2)
+        return iter_pages(self.page(0, *args, **kwargs), prefetch)
+
 
 class Endpoint(EndpointBase):
     default_page_size = 20
+    max_page_size = 200
+    id_field = "id"
+    max_ids = 200
+    max_workers = 4
+    stream_chunk_size = 64 * 1024
+    supports_all = None
+
+    def __init__(self, name, versioned=None, supports_all=None):
+        super(Endpoint, self).__init__(name, versioned)
+        if supports_all is not None:
+            self.supports_all = supports_all
 
     def get_ids(self):
         return self.get_cached(self.name, self.name + ".json")
 
+    def fetch_ids(self):
+        """Request the ids of all entities, bypassing the cache.
+        """
+        meta, data = self._get(self.name)
+        return data
+
+    def fetch_many(self, ids, params=None):
+        """Request entities by id, bypassing the cache, in chunks of at most
+        ``max_ids`` ids that are fetched using up to ``max_workers`` threads.
+        Returns the entities in the requested order. Ids that do not exist
+        are left out, including chunks in which no id exists, which the API
+        answers with ``404 Not Found``.
+        """
+        def fetch(chunk):
+            return self.fetch_chunk(chunk, params)
+
+        chunks = self.missing_chunks(unique(ids), {})
+        responses = parallel_map(fetch, chunks, self.max_workers)
+        return [entity for data in responses for entity in data]
+
+    def fetch_chunk(self, ids, params=None):
+        kwargs = {"params": dict(params or {}, ids=",".join(ids))}
+        try:
+            meta, data = self._get(self.name, **kwargs)
+        except requests.HTTPError as e:
+            if error_status(e) != 404:
+                raise
+            return []
+        return data
+
     def get_all(self):
         cache_name = self.name + ".all.json"
-        return self.get_cached(self.name, cache_name, params={"ids": "all"})
+        return self.get_all_or_many(
+            lambda: self.get_cached(self.name, cache_name,
+                                    params={"ids": "all"}),
+            self.get_many)
+
+    def get_all_or_many(self, get_all, get_many):
+        """Call ``get_all``, unless the endpoint does not support ``ids=all``.
+        In that case, or when the API rejects the request, call
+        ``get_many`` with the ids from :meth:`get_ids` instead.
+        """
+        if self.supports_all is not False:
+            try:
+                return get_all()
+            except requests.HTTPError as e:
+                if not is_rejected(e):
+                    raise
+                self.supports_all = False
+
+        return get_many(self.get_ids())
+
+    def get_all_pages(self, *args, **kwargs):
+        """Request all entities page by page, using the largest page size.
+        The first page is requested on its own to find the total number of
+        pages, then the other pages are requested using up to
+        ``max_workers`` threads. Further arguments are passed on to
+        :meth:`page`.
+        """
+        def fetch(page):
+            return self.page(page, self.max_page_size, *args, **kwargs)
+
+        first = fetch(0)
+        total = (first.meta or {}).get("page_total", 1)
+        pages = parallel_map(fetch, range(1, total), self.max_workers)
+        return self.merge_pages([first] + pages)
+
+    def merge_pages(self, pages):
+        data = [entity for page in pages for entity in page]
+        meta = {"result_count": len(data)}
+        result_total = (pages[0].meta or {}).get("result_total")
+        if result_total is not None:
+            meta["result_total"] = result_total
+        return self.make_response(data, meta)
+
+    def iter_all(self):
+        """Request all entities, yielding them one at a time while the
+        response is being received. Unlike :meth:`get_all`, the response is
+        never held in memory as a whole.
+
+        The entities are cached separately, like :meth:`get` does, in batches
+        of ``max_ids`` entities. For endpoints that do not support
+        ``ids=all``, the entities are requested in chunks of ``max_ids``
+        entities instead, using up to ``max_workers`` threads.
+        """
+        return self.iter_all_or_many(self.name, {"ids": "all"}, self.get_many)
+
+    def iter_all_or_many(self, cache_prefix, params, get_many):
+        if self.supports_all is not False:
+            try:
+                for entity in self.iter_entities(cache_prefix, params):
+                    yield entity
+                return
+            except requests.HTTPError as e:
+                if not is_rejected(e):
+                    raise
+                self.supports_all = False
+
+        ids = self.get_ids()
+        chunks = [ids[i:i + self.max_ids]
+                  for i in range(0, len(ids), self.max_ids)]
+        for data in prefetch_map(get_many, chunks, self.max_workers):
+            for entity in data:
+                yield entity
+
+    def iter_entities(self, cache_prefix, params):
+        r = self.send(self.name, params=params, stream=True)
+        try:
+            if not r.ok:
+                try:
+                    response = r.json()
+                except ValueError:  # pragma: no cover
+                    response = None
+                if isinstance(response, dict) and "text" in response:
+                    r.reason = response["text"]
+                r.raise_for_status()
+
+            batch = []
+            chunks = r.iter_content(self.stream_chunk_size)
+            for entity in iter_json_array(chunks):
+                batch.append(entity)
+                if len(batch) == self.max_ids:
+                    self.store_batch(cache_prefix, batch)
+                    batch = []
+                yield entity
+            self.store_batch(cache_prefix, batch)
+        finally:
+            r.close()
+
+    def store_batch(self, cache_prefix, entities):
+        if self.has_entity_ids(entities):
+            cache_names = dict((id, "%s.%s.json" % (cache_prefix, id))
+                               for id in self.index_entities(entities))
+            self.store_entities(cache_names, entities)
 
     def get(self, *args):
         if len(args) == 1:
             if (isinstance(args[0], six.string_types) or
-                    not isinstance(args[0], collections.Iterable)):
+                    not isinstance(args[0], Iterable)):
                 return self.get_one(args[0])
 
             args = args[0]
 
-        params = {"ids": ",".join(map(str, args))}
-        cache_name = self.name + ".%(ids)s.json" % params
+        return self.get_many(args)
+
+    def get_many(self, ids):
+        return self.get_entities(ids, self.name, {})
+
+    def get_entities(self, ids, cache_prefix, params):
+        """Request multiple entities by id. Every entity is cached separately,
+        under the same name :meth:`get_one` uses, so only the ids that are not
+        cached are requested from the API, in chunks of at most ``max_ids``
+        ids that are fetched using up to ``max_workers`` threads. The entities
+        are returned in the requested order.
+        """
+        ids, cache_names, entities = self.load_entities(ids, cache_prefix)
+
+        def fetch(chunk):
+            kwargs = {"params": dict(params, ids=",".join(chunk))}
 
-        return self.get_cached(self.name, cache_name, params=params)
+            def fetch_chunk():
+                meta, data = self._get(self.name, **kwargs)
+                self.store_entities(cache_names, data)
+                return meta, data
+
+            return in_flight.call(self.request_key(self.name, kwargs),
+                                  fetch_chunk)
+
+        chunks = self.missing_chunks(ids, entities)
+        responses = parallel_map(fetch, chunks, self.max_workers)
+        return self.merge_entities(ids, entities, responses)
+
+    def load_entities(self, ids, cache_prefix):
+        """Look up entities in the cache. Returns the normalized ids, their
+        cache names and a dictionary with the fresh entities that were found.
+        """
+        ids = unique(ids)
+        cache_names = dict((id, "%s.%s.json" % (cache_prefix, id))
+                           for id in ids)
+        entities = {}
+
+        cache = self.get_cache(cache_prefix)
+        if cache is not None:
+            entries = cache.get_many(cache_names.values())
+            for id in ids:
+                entry = entries.get(cache_names[id])
+                if entry is not None and self.is_fresh(entry):
+                    entities[id] = entry.value["data"]
+
+        return ids, cache_names, entities
+
+    def store_entities(self, cache_names, data):
+        cache = self.get_cache(self.name)
+        if cache is not None and self.has_entity_ids(data):
+            cache.set_many(
+                ((cache_names[id], {"meta": {}, "data": entity})
+                 for id, entity in self.index_entities(data).items()
+                 if id in cache_names),
+                **self.entry_options())
+
+    def missing_chunks(self, ids, entities):
+        missing = [id for id in ids if id not in entities]
+        return [missing[i:i + self.max_ids]
+                for i in range(0, len(missing), self.max_ids)]
+
+    def merge_entities(self, ids, entities, responses):
+        meta = merge_meta([meta for meta, data in responses])
+
+        chunk_data = [data for meta, data in responses]
+        if not all(self.has_entity_ids(data) for data in chunk_data):
+            if len(chunk_data) == 1:
+                return self.make_response(chunk_data[0], meta)
+            return self.make_response(
+                [entity for data in chunk_data for entity in data], meta)
+
+        for data in chunk_data:
+            entities.update(self.index_entities(data))
+
+        data = [entities[id] for id in ids if id in entities]
+        return self.make_response(data, meta)
+
+    def index_entities(self, data):
+        return dict((six.text_type(entity[self.id_field]), entity)
+                    for entity in data)
+
+    def has_entity_ids(self, data):
+        return isinstance(data, list) and all(
+            isinstance(entity, dict) and self.id_field in entity
+            for entity in data)
 
     def get_one(self, id):
         name = "%s/%s" % (self.name, id)
@@ -131,7 +565,7 @@ class Endpoint(EndpointBase):
         params = {"page": page, "page_size": page_size}
         cache_name = self.name + ".page-%(page)d.%(page_size)d.json" % params
         data = self.get_cached(self.name, cache_name, params=params)
-        return ListWrapper(self, page, data, args=(page_size, ))
+        return self.make_page(page, data, (page_size, ))
 
 
 class LocaleAwareEndpoint(Endpoint):
@@ -143,22 +577,33 @@ class LocaleAwareEndpoint(Endpoint):
 
         params = {"ids": "all", "lang": lang}
         cache_name = self.name + "." + lang + ".all.json"
-        return self.get_cached(self.name, cache_name, params=params)
+        return self.get_all_or_many(
+            lambda: self.get_cached(self.name, cache_name, params=params),
+            lambda ids: self.get_many(ids, lang))
+
+    def iter_all(self, lang=None):
+        if lang is None:
+            lang = self.default_language
+        return self.iter_all_or_many(self.name + "." + lang,
+                                     {"ids": "all", "lang": lang},
+                                     lambda ids: self.get_many(ids, lang))
 
     def get(self, *args, **kwargs):
         lang = kwargs.get("lang") or self.default_language
 
         if len(args) == 1:
             if (isinstance(args[0], six.string_types) or
-                    not isinstance(args[0], collections.Iterable)):
+                    not isinstance(args[0], Iterable)):
                 return self.get_one(args[0], lang)
 
             args = args[0]
 
-        params = {"ids": ",".join(map(str, args)), "lang": lang}
-        cache_name = self.name + ".%(lang)s.%(ids)s.json" % params
+        return self.get_many(args, lang)
 
-        return self.get_cached(self.name, cache_name, params=params)
+    def get_many(self, ids, lang=None):
+        if lang is None:
+            lang = self.default_language
+        return self.get_entities(ids, self.name + "." + lang, {"lang": lang})
 
     def get_one(self, id, lang=None):
         if lang is None:
@@ -177,10 +622,59 @@ class LocaleAwareEndpoint(Endpoint):
         cache_name = (self.name + "." + lang +
                       ".page-%(page)d.%(page_size)d.json" % params)
         data = self.get_cached(self.name, cache_name, params=params)
-        return ListWrapper(self, page, data, args=(page_size, lang))
+        return self.make_page(page, data, (page_size, lang))
 
 
 class BuildEndpoint(EndpointBase):
     def get(self):
         build = self.get_cached(self.name, None)
         return build["id"]
+
+
+class BuildTracker(object):
+    """Keep track of the current game build, checking it at most once every
+    ``gw2api.build_check_interval`` seconds.
+    """
+
+    def __init__(self, endpoint):
+        super(BuildTracker, self).__init__()
+        self.endpoint = endpoint
+        self.build_id = None
+        self.checked = None
+        self.lock = threading.Lock()
+
+    def get_build_id(self):
+        with self.lock:
+            if self.needs_check():
+                try:
+                    self.build_id = self.endpoint.get()
+                except requests.RequestException:
+                    # Keep using the last known build.
+                    pass
+                self.checked = time.time()
+            return self.build_id
+
+    def needs_check(self):
+        """Check whether the build should be requested again.
+        """
+        return self.checked is None or \
+            time.time() - self.checked >= gw2api.build_check_interval
+
+    def update(self, build_id):
+        """Record the result of a build check made elsewhere, such as by an
+        asynchronous endpoint. ``None`` keeps the last known build.
+        """
+        with self.lock:
+            if build_id is not None:
+                self.build_id = build_id
+            self.checked = time.time()
+
+    def reset(self):
+        with self.lock:
+            self.build_id = None
+            self.checked = None
+
+
+build_tracker = BuildTracker(BuildEndpoint("build"))
+refresher = Refresher()
+in_flight = SingleFlight()
@@ -0,0 +1,148 @@
+"""Query items by type, rarity, level and flags without scanning them all.
+
+An :class:`ItemStore` is filled with items from :data:`gw2api.v2.items`, for
+example from ``get_all()``, ``iter_all()`` or a
+:class:`gw2api.v2.mirror.Mirror`::
+
+    store = ItemStore(gw2api.v2.items.iter_all())
+    weapons = store.query(type="Weapon", rarity="Exotic", level=80,
+                          flags="NoSalvage")
+"""
+import six
+
+
+__all__ = ("ItemStore", )
+
+
+class ItemStore(object):
+    """Keep items in memory, with an index for every field in
+    ``indexed_fields``. An index maps every value of the field to the set of
+    ids of the items with that value. Fields with a list of values (such as
+    ``flags``) have an entry for every value in the list.
+
+    :param items: the items to add to the store
+    """
+    indexed_fields = ("type", "rarity", "level", "flags")
+
+    def __init__(self, items=()):
+        super(ItemStore, self).__init__()
+        self.items = {}
+        self.indexes = dict((field, {}) for field in self.indexed_fields)
+        self.update(items)
+
+    def add(self, item):
+        """Add an item, replacing the item with the same id.
+        """
+        id = item["id"]
+        if id in self.items:
+            self.remove(id)
+
+        self.items[id] = item
+        for field, index in self.indexes.items():
+            for value in self.field_values(item, field):
+                index.setdefault(value, set()).add(id)
+
+    def update(self, items):
+        """Add all items in ``items``.
+        """
+        for item in items:
+            self.add(item)
+
+    def remove(self, id):
+        """Remove the item with id ``id``, if there is one.
+        """
+        item = self.items.pop(id, None)
+        if item is None:
+            return
+
+        for field, index in self.indexes.items():
+            for value in self.field_values(item, field):
+                postings = index.get(value)
+                if postings is not None:
+                    postings.discard(id)
+                    if not postings:
+                        del index[value]
+
+    def field_values(self, item, field):
+        value = item.get(field)
+        if value is None:
+            return ()
+        if isinstance(value, list):
+            return value
+        return (value, )
+
+    def get(self, id):
+        """Get the item with id ``id``, or ``None``.
+        """
+        return self.items.get(id)
+
+    def values(self, field):
+        """Get the indexed values of ``field``, with the number of items that
+        have each value.
+        """
+        return dict((value, len(ids))
+                    for value, ids in self.indexes[field].items())
+
+    def query_ids(self, min_level=None, max_level=None, **criteria):
+        """Get the set of ids of the items matching all criteria. See
+        :meth:`query`.
+        """
+        postings = []
+        for field, value in criteria.items():
+            if field not in self.indexes:
+                raise ValueError("field '%s' is not indexed" % field)
+
+            index = self.indexes[field]
+            if field == "flags":
+                # Every flag is required.
+                if isinstance(value, six.string_types):
+                    value = [value]
+                postings.extend(index.get(flag, set()) for flag in value)
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                # Any of the values matches.
+                postings.append(set().union(*[index.get(v, set())
+                                              for v in value]))
+            else:
+                postings.append(index.get(value, set()))
+
+        if min_level is not None or max_level is not None:
+            index = self.indexes["level"]
+            postings.append(set().union(*[
+                ids for level, ids in index.items()
+                if (min_level is None or level >= min_level) and
+                (max_level is None or level <= max_level)]))
+
+        if not postings:
+            return set(self.items)
+
+        # Intersect the smallest sets first, so the result shrinks quickly.
+        postings.sort(key=len)
+        result = set(postings[0])
+        for ids in postings[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
+
+    def query(self, min_level=None, max_level=None, **criteria):
+        """Get the items matching all criteria, ordered by id.
+
+        Criteria are given as ``field=value`` for the indexed fields. A list
+        of values matches items with any of the values, except for ``flags``,
+        where items must have all of the given flags. ``min_level`` and
+        ``max_level`` select a range of levels::
+
+            store.query(type="Weapon", rarity=["Exotic", "Ascended"],
+                        min_level=78, flags=["NoSalvage", "AccountBound"])
+        """
+        ids = self.query_ids(min_level, max_level, **criteria)
+        return [self.items[id] for id in sorted(ids)]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items.values())
+
+    def __contains__(self, id):
+        return id in self.items
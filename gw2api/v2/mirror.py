@@ -0,0 +1,169 @@
+"""Keep a complete local copy of the entities of a v2 endpoint.
+
+A :class:`Mirror` stores every entity of an endpoint in a cache backend and
+brings the copy up to date incrementally::
+
+    from gw2api.cache import SqliteCache
+    from gw2api.v2.mirror import Mirror
+
+    items = Mirror(gw2api.v2.items, SqliteCache("mirror.sqlite"))
+    items.sync()
+    print(items.get(30684))
+"""
+import six
+
+from .endpoint import BuildEndpoint, LocaleAwareEndpoint
+from .util import unique
+
+
+__all__ = ("Mirror", )
+
+
+class Mirror(object):
+    """A local copy of all entities of ``endpoint``, stored in ``backend``.
+
+    :meth:`sync` compares the ids of the endpoint with the ids that were
+    mirrored before. Only new entities are requested, entities that were
+    removed from the API are deleted, and when the game build has changed,
+    all entities are requested again to pick up changes.
+
+    Progress is recorded after every ``max_workers`` chunks of ``max_ids``
+    entities, so an interrupted sync continues where it stopped.
+
+    :param endpoint: the :class:`gw2api.v2.endpoint.Endpoint` to mirror
+    :param backend: the :class:`gw2api.cache.CacheBackend` to store the
+                    entities in. Entries are stored without expiry time.
+    :param lang: the language of the entities for locale aware endpoints
+    """
+    build_endpoint = BuildEndpoint("build")
+
+    def __init__(self, endpoint, backend, lang=None):
+        super(Mirror, self).__init__()
+        self.endpoint = endpoint
+        self.backend = backend
+        self.lang = lang
+        if isinstance(endpoint, LocaleAwareEndpoint):
+            self.lang = lang or endpoint.default_language
+
+        name = endpoint.name.replace("/", "_")
+        if self.lang is not None:
+            name += "." + self.lang
+        self.prefix = "mirror." + name
+
+    def key(self, id):
+        return "%s.%s.json" % (self.prefix, id)
+
+    def load_state(self):
+        entry = self.backend.get(self.prefix + ".json")
+        if entry is None:
+            return {"ids": [], "build": None, "pending": []}
+        return entry.value
+
+    def save_state(self, state):
+        self.backend.set(self.prefix + ".json", state)
+
+    def sync(self):
+        """Bring the mirror up to date. Returns the number of entities that
+        were ``added``, ``updated``, ``unchanged`` and ``removed``.
+
+        The ids are requested without using the response cache. Until the
+        sync has finished, :meth:`ids` only includes the entities that were
+        mirrored before it started, and the ids being mirrored are kept in
+        the ``target`` of the state.
+        """
+        ids = unique(self.endpoint.fetch_ids())
+        build = self.build_endpoint.get()
+        state = self.load_state()
+        result = dict.fromkeys(("added", "updated", "unchanged", "removed"),
+                               0)
+
+        # Entities of an interrupted sync that were stored already.
+        target, pending = state.get("target", []), set(state["pending"])
+        stored = unique(state["ids"] +
+                        [id for id in target if id not in pending])
+
+        current = set(ids)
+        removed = [id for id in stored if id not in current]
+        for id in removed:
+            self.backend.delete(self.key(id))
+        result["removed"] = len(removed)
+
+        if build != state["build"] and state.get("syncing") != build:
+            # Check all entities again, they may have changed.
+            pending = ids
+        else:
+            known = set(stored)
+            pending = unique([id for id in state["pending"]
+                              if id in current] +
+                             [id for id in ids if id not in known])
+
+        state.update(ids=[id for id in state["ids"] if id in current],
+                     target=ids, pending=pending, syncing=build)
+        self.save_state(state)
+
+        group_size = self.endpoint.max_ids * self.endpoint.max_workers
+        while pending:
+            group, pending = pending[:group_size], pending[group_size:]
+            self.store(self.endpoint.fetch_many(group, self.params()), result)
+
+            state["pending"] = pending
+            self.save_state(state)
+
+        state["ids"] = ids
+        state["build"] = build
+        del state["target"], state["syncing"]
+        self.save_state(state)
+        return result
+
+    def params(self):
+        return {"lang": self.lang} if self.lang is not None else {}
+
+    def store(self, data, result):
+        entities = self.endpoint.index_entities(data)
+        keys = dict((id, self.key(id)) for id in entities)
+        stored = self.backend.get_many(keys.values())
+
+        for id, entity in entities.items():
+            entry = stored.get(keys[id])
+            if entry is None:
+                result["added"] += 1
+            elif entry.value != entity:
+                result["updated"] += 1
+            else:
+                result["unchanged"] += 1
+
+        self.backend.set_many((keys[id], entity)
+                              for id, entity in entities.items())
+
+    def ids(self):
+        """Get the ids of all mirrored entities.
+        """
+        return list(self.load_state()["ids"])
+
+    def get(self, id):
+        """Get a mirrored entity, or ``None``.
+        """
+        entry = self.backend.get(self.key(six.text_type(id)))
+        return entry.value if entry is not None else None
+
+    def get_many(self, ids):
+        """Get the mirrored entities with the given ids, in order. Ids that
+        are not mirrored are left out.
+        """
+        ids = unique(ids)
+        entries = self.backend.get_many(self.key(id) for id in ids)
+        return [entries[self.key(id)].value for id in ids
+                if self.key(id) in entries]
+
+    def __iter__(self):
+        ids = self.ids()
+        chunk_size = self.endpoint.max_ids
+        for i in range(0, len(ids), chunk_size):
+            for entity in self.get_many(ids[i:i + chunk_size]):
+                yield entity
+
+    def __len__(self):
+        return len(self.load_state()["ids"])
+
+    def __contains__(self, id):
+        return self.backend.contains(self.key(six.text_type(id)))
@@ -0,0 +1,191 @@
+"""Answer depth queries on trading post listings.
+
+An :class:`OrderBook` keeps the listings of ``commerce/listings`` in flat
+arrays with the cumulative quantity and cost of every price level, so the
+cost of buying or selling a quantity of an item is found with a binary
+search::
+
+    book = OrderBook.fetch([19721, 19684])
+    print(book.fill_cost(19721, 250))
+    print(book.fill_costs(250))
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+import gw2api.v2
+
+
+__all__ = ("OrderBook", )
+
+
+class Side(object):
+    """One side of the listings of all items. The price levels of item
+    ``i`` are ``offsets[i]:offsets[i + 1]``, ordered from the best price to
+    the worst. ``keys`` are the prices for sell listings and the negated
+    prices for buy listings, so they are ascending for both sides.
+    """
+
+    def __init__(self, sign):
+        super(Side, self).__init__()
+        self.sign = sign
+        self.offsets = array("l", [0])
+        self.keys = array("l")
+        self.prices = array("l")
+        self.quantities = array("l")
+        self.costs = array("d")
+
+    def add(self, levels):
+        levels = sorted(levels,
+                        key=lambda level: self.sign * level["unit_price"])
+        quantity, cost = 0, 0.0
+        for level in levels:
+            quantity += level["quantity"]
+            cost += level["quantity"] * level["unit_price"]
+            self.keys.append(self.sign * level["unit_price"])
+            self.prices.append(level["unit_price"])
+            self.quantities.append(quantity)
+            self.costs.append(cost)
+        self.offsets.append(len(self.prices))
+
+    def best(self, i):
+        first = self.offsets[i]
+        return self.prices[first] if first < self.offsets[i + 1] else None
+
+    def total(self, i):
+        first, last = self.offsets[i], self.offsets[i + 1]
+        return self.quantities[last - 1] if last > first else 0
+
+    def fill_cost(self, i, quantity):
+        first, last = self.offsets[i], self.offsets[i + 1]
+        level = bisect_left(self.quantities, quantity, first, last)
+        if level == last:
+            return None
+        if level == first:
+            return float(quantity * self.prices[level])
+        return (self.costs[level - 1] +
+                (quantity - self.quantities[level - 1]) * self.prices[level])
+
+    def depth(self, i, price):
+        first, last = self.offsets[i], self.offsets[i + 1]
+        level = bisect_right(self.keys, self.sign * price, first, last)
+        return self.quantities[level - 1] if level > first else 0
+
+
+class OrderBook(object):
+    """The listings of many items, stored in compact arrays.
+
+    For every item and side, the price levels are ordered from the best
+    price to the worst, together with the cumulative quantity and cost up
+    to each level.
+
+    Queries take a ``side``: ``"sells"`` to buy from sell listings, which is
+    the default, or ``"buys"`` to sell to buy orders. Methods named in plural
+    answer the query for all items at once.
+
+    :param listings: ``commerce/listings`` entries
+    """
+
+    def __init__(self, listings=()):
+        super(OrderBook, self).__init__()
+        self.ids = []
+        self.index = {}
+        self.sides = {"buys": Side(-1), "sells": Side(1)}
+        for entry in listings:
+            self.add(entry)
+
+    @classmethod
+    def fetch(cls, ids=None, endpoint=None):
+        """Request the current listings of ``ids``, or of all items, in
+        parallel chunks, and build an order book from them. The cache is not
+        used, so the listings are never stale.
+
+        :param endpoint: the endpoint to request listings from, defaults to
+                         :data:`gw2api.v2.listings`
+        """
+        endpoint = endpoint or gw2api.v2.listings
+        if ids is None:
+            ids = endpoint.fetch_ids()
+        return cls(endpoint.fetch_many(ids))
+
+    def add(self, entry):
+        """Add the listings of an item. Items can only be added once.
+        """
+        if entry["id"] in self.index:
+            raise ValueError("item %s is already in the order book" %
+                             entry["id"])
+        self.index[entry["id"]] = len(self.ids)
+        self.ids.append(entry["id"])
+        for name, side in self.sides.items():
+            side.add(entry.get(name, ()))
+
+    def best(self, item_id, side="sells"):
+        """Get the best price of ``item_id``: the lowest sell listing or the
+        highest buy order. Returns ``None`` without listings.
+        """
+        return self.sides[side].best(self.index[item_id])
+
+    def spread(self, item_id):
+        """Get the difference between the lowest sell listing and the highest
+        buy order of ``item_id``, or ``None`` if either side is empty.
+        """
+        i = self.index[item_id]
+        sell = self.sides["sells"].best(i)
+        buy = self.sides["buys"].best(i)
+        if sell is None or buy is None:
+            return None
+        return sell - buy
+
+    def quantity(self, item_id, side="sells"):
+        """Get the total listed quantity of ``item_id``.
+        """
+        return self.sides[side].total(self.index[item_id])
+
+    def fill_cost(self, item_id, quantity, side="sells"):
+        """Get the total price of buying (or selling) ``quantity`` of
+        ``item_id``, filling the best listings first. Returns ``None`` if not
+        enough are listed.
+        """
+        return self.sides[side].fill_cost(self.index[item_id], quantity)
+
+    def depth(self, item_id, price, side="sells"):
+        """Get the quantity of ``item_id`` listed at ``price`` or better: at
+        or below ``price`` for sells, at or above it for buys.
+        """
+        return self.sides[side].depth(self.index[item_id], price)
+
+    def spreads(self):
+        """Get the spread of all items with listings on both sides.
+        """
+        spreads = {}
+        for item_id in self.ids:
+            spread = self.spread(item_id)
+            if spread is not None:
+                spreads[item_id] = spread
+        return spreads
+
+    def fill_costs(self, quantity, side="sells"):
+        """Get the price of buying (or selling) ``quantity`` of every item
+        with enough listings.
+        """
+        side = self.sides[side]
+        costs = {}
+        for i, item_id in enumerate(self.ids):
+            cost = side.fill_cost(i, quantity)
+            if cost is not None:
+                costs[item_id] = cost
+        return costs
+
+    def depths(self, prices, side="sells"):
+        """Get the quantity listed at the given price or better, for a
+        dictionary of item ids and prices.
+        """
+        side = self.sides[side]
+        return dict((item_id, side.depth(self.index[item_id], price))
+                    for item_id, price in prices.items()
+                    if item_id in self.index)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.index
@@ -0,0 +1,264 @@
+"""Collect the trading post prices of all items over time.
+
+A :class:`PriceHistory` keeps snapshots of ``commerce/prices`` in columns of
+typed arrays, optionally backed by append-only files. A
+:class:`PriceCollector` fills it with a snapshot of all tradable items on a
+schedule::
+
+    history = PriceHistory("prices")
+    collector = PriceCollector(history, interval=300)
+    collector.start()
+    ...
+    for timestamp, buy, buy_quantity, sell, sell_quantity in \\
+            history.item(19721, start=time.time() - 24 * 3600):
+        print(timestamp, sell)
+"""
+import os
+import time
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+import gw2api.v2
+
+
+__all__ = ("PriceHistory", "PriceCollector")
+
+
+logger = logging.getLogger(__name__)
+
+
+class PriceHistory(object):
+    """Snapshots of trading post prices, stored by column.
+
+    Every snapshot adds one row per item, ordered by item id, to the columns
+    in :attr:`columns`. The time and the end row of every snapshot are kept
+    in :attr:`times` and :attr:`ends`, so snapshots are found by binary
+    search on time and items by binary search on id within a snapshot.
+
+    Values are stored as 32-bit integers, end rows as 64-bit integers and
+    times as 64-bit floats, in the native byte order, so the files can be
+    moved between platforms with the same byte order.
+
+    :param directory: the directory to store the columns in, one append-only
+                      file per column. Without a directory the history is
+                      only kept in memory.
+    """
+    columns = (("item_ids", "i"), ("buy_price", "i"), ("buy_quantity", "i"),
+               ("sell_price", "i"), ("sell_quantity", "i"))
+    max_rows = 2 ** 63 - 1
+
+    def __init__(self, directory=None):
+        super(PriceHistory, self).__init__()
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.times = array("d")
+        self.ends = array("q")
+        self.data = dict((name, array(typecode))
+                         for name, typecode in self.columns)
+        if directory is not None:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            self.load()
+
+    def path(self, name):
+        return os.path.join(self.directory, name + ".bin")
+
+    def read_column(self, name, values):
+        path = self.path(name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                values.fromfile(f, size // values.itemsize)
+
+    def truncate_column(self, name, values, count):
+        """Drop the rows after ``count``, which were written by an append
+        that did not complete.
+        """
+        if len(values) > count:
+            del values[count:]
+        path = self.path(name)
+        if os.path.exists(path):
+            with open(path, "r+b") as f:
+                f.truncate(count * values.itemsize)
+
+    def load(self):
+        self.read_column("times", self.times)
+        self.read_column("ends", self.ends)
+
+        count = min(len(self.times), len(self.ends))
+        for name, values in self.data.items():
+            self.read_column(name, values)
+        # Snapshots are complete when all of their rows were written.
+        rows = min(len(values) for values in self.data.values())
+        while count and self.ends[count - 1] > rows:
+            count -= 1
+
+        rows = self.ends[count - 1] if count else 0
+        self.truncate_column("times", self.times, count)
+        self.truncate_column("ends", self.ends, count)
+        for name, values in self.data.items():
+            self.truncate_column(name, values, rows)
+
+    def append(self, timestamp, prices):
+        """Add a snapshot of ``commerce/prices`` entries, taken at
+        ``timestamp``. Snapshots must be added in order of time.
+        """
+        rows = dict((name, array(typecode))
+                    for name, typecode in self.columns)
+        for price in sorted(prices, key=lambda price: price["id"]):
+            buys, sells = price.get("buys", {}), price.get("sells", {})
+            rows["item_ids"].append(price["id"])
+            rows["buy_price"].append(buys.get("unit_price", 0))
+            rows["buy_quantity"].append(buys.get("quantity", 0))
+            rows["sell_price"].append(sells.get("unit_price", 0))
+            rows["sell_quantity"].append(sells.get("quantity", 0))
+
+        with self.lock:
+            if self.times and timestamp < self.times[-1]:
+                raise ValueError("snapshot at %s is before the last "
+                                 "snapshot at %s" % (timestamp,
+                                                     self.times[-1]))
+            end = len(self.data["item_ids"]) + len(rows["item_ids"])
+            if end > self.max_rows:
+                raise ValueError("snapshot at %s does not fit in the history "
+                                 "of %s rows" % (timestamp, self.max_rows))
+
+            # Rows are written before the snapshot that refers to them, so
+            # an interrupted append is dropped by load().
+            for name, values in self.data.items():
+                values.extend(rows[name])
+                self.write_column(name, rows[name])
+            # Snapshots are found by time, so readers that do not hold the
+            # lock never see a time without its end row.
+            self.ends.append(end)
+            self.times.append(timestamp)
+            self.write_column("ends", self.ends[-1:])
+            self.write_column("times", self.times[-1:])
+
+    def write_column(self, name, values):
+        if self.directory is not None:
+            with open(self.path(name), "ab") as f:
+                values.tofile(f)
+
+    def snapshots(self, start=None, end=None):
+        """Get the indexes of the snapshots taken from ``start`` up to, but
+        not including, ``end``.
+        """
+        first = 0 if start is None else bisect_left(self.times, start)
+        last = len(self.times) if end is None else \
+            bisect_left(self.times, end)
+        return range(first, last)
+
+    def find(self, snapshot, item_id):
+        """Get the row of ``item_id`` in a snapshot, or ``None``.
+        """
+        first = self.ends[snapshot - 1] if snapshot else 0
+        last = self.ends[snapshot]
+        item_ids = self.data["item_ids"]
+        row = bisect_left(item_ids, item_id, first, last)
+        if row < last and item_ids[row] == item_id:
+            return row
+        return None
+
+    def row(self, row):
+        return tuple(self.data[name][row] for name, typecode in
+                     self.columns[1:])
+
+    def item(self, item_id, start=None, end=None):
+        """Get the prices of ``item_id`` from ``start`` up to, but not
+        including, ``end`` as a list of ``(timestamp, buy_price,
+        buy_quantity, sell_price, sell_quantity)`` tuples.
+        """
+        result = []
+        with self.lock:
+            for snapshot in self.snapshots(start, end):
+                row = self.find(snapshot, item_id)
+                if row is not None:
+                    result.append((self.times[snapshot], ) + self.row(row))
+        return result
+
+    def at(self, timestamp):
+        """Get the latest snapshot taken at or before ``timestamp``, as a
+        dictionary of item ids and ``(buy_price, buy_quantity, sell_price,
+        sell_quantity)`` tuples.
+        """
+        with self.lock:
+            snapshot = bisect_right(self.times, timestamp) - 1
+            if snapshot < 0:
+                return {}
+            first = self.ends[snapshot - 1] if snapshot else 0
+            item_ids = self.data["item_ids"]
+            return dict((item_ids[row], self.row(row))
+                        for row in range(first, self.ends[snapshot]))
+
+    def __len__(self):
+        return len(self.times)
+
+
+class PriceCollector(object):
+    """Add a snapshot of the prices of all tradable items to a
+    :class:`PriceHistory` every ``interval`` seconds.
+
+    The ids of the tradable items and their prices are requested without
+    using the cache, in chunks of ``max_ids`` ids using up to ``max_workers``
+    threads of the endpoint.
+
+    :param history: the :class:`PriceHistory` to add snapshots to
+    :param interval: the number of seconds between two snapshots
+    :param endpoint: the endpoint to request prices from, defaults to
+                     :data:`gw2api.v2.prices`
+    """
+
+    def __init__(self, history, interval=300, endpoint=None):
+        super(PriceCollector, self).__init__()
+        self.history = history
+        self.interval = interval
+        self.endpoint = endpoint or gw2api.v2.prices
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def collect(self):
+        """Take a snapshot of the prices of all tradable items now. Returns
+        the number of items in the snapshot.
+        """
+        timestamp = time.time()
+        prices = self.endpoint.fetch_many(self.endpoint.fetch_ids())
+        self.history.append(timestamp, prices)
+        return len(prices)
+
+    def run(self, count=None):
+        """Take ``count`` snapshots, or snapshots until :meth:`stop` is
+        called, ``interval`` seconds apart. Failed snapshots are logged and
+        skipped.
+        """
+        while count is None or count > 0:
+            started = time.time()
+            try:
+                self.collect()
+            except Exception:
+                logger.exception("Collecting prices failed")
+            if count is not None:
+                count -= 1
+                if not count:
+                    break
+            delay = max(0, self.interval - (time.time() - started))
+            if self.stopped.wait(delay):
+                break
+
+    def start(self):
+        """Collect snapshots on a background thread.
+        """
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop collecting snapshots and wait for the current one.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -2,6 +2,8 @@ from .endpoint import EndpointBase
 
 
 class RecipeSearchEndpoint(EndpointBase):
+    versioned = True
+
     def __init__(self, recipe_endpoint):
         super(RecipeSearchEndpoint, self).__init__("recipes/search")
         self.recipe_endpoint = recipe_endpoint
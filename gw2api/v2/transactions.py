@@ -1,6 +1,5 @@
 from .endpoint import EndpointBase
 from .account import AuthenticatedMixin
-from .util import ListWrapper
 
 
 class TransactionEndpoint(AuthenticatedMixin, EndpointBase):
@@ -8,7 +7,7 @@ class TransactionEndpoint(AuthenticatedMixin, EndpointBase):
         path = self.name + "/" + suffix
         params = {"page": page, "page_size": page_size}
         data = self.get_cached(path, None, params=params)
-        return ListWrapper(self, page, data, args=(page_size, suffix))
+        return self.make_page(page, data, (page_size, suffix))
 
     def current_buys(self, page=0, page_size=20):
         return self.page(page, page_size, "current/buys")
@@ -1,3 +1,232 @@
+import re
+import sys
+import json
+import codecs
+import logging
+import itertools
+import threading
+import collections
+from multiprocessing.pool import ThreadPool
+
+import six
+
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def unique(ids):
+    """Convert ids to text and remove duplicates, keeping the original order.
+    """
+    seen = set()
+    result = []
+    for id in map(six.text_type, ids):
+        if id not in seen:
+            seen.add(id)
+            result.append(id)
+    return result
+
+
+def parallel_map(func, items, max_workers):
+    """Call ``func`` for every item using at most ``max_workers`` threads.
+    Returns the results in the order of ``items``.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+class Refresher(object):
+    """Run functions on a small pool of background threads, with at most one
+    pending call per key.
+    """
+
+    def __init__(self, max_workers=2):
+        super(Refresher, self).__init__()
+        self.max_workers = max_workers
+        self.pool = None
+        self.pending = set()
+        self.condition = threading.Condition()
+
+    def submit(self, key, func):
+        """Call ``func`` in the background, unless a call for ``key`` is
+        already pending. Returns whether ``func`` was scheduled.
+        """
+        with self.condition:
+            if key in self.pending:
+                return False
+            self.pending.add(key)
+            if self.pool is None:
+                self.pool = ThreadPool(self.max_workers)
+
+        self.pool.apply_async(self.run, (key, func))
+        return True
+
+    def run(self, key, func):
+        try:
+            func()
+        except Exception:
+            logger.exception("Background refresh of %s failed", key)
+        finally:
+            with self.condition:
+                self.pending.discard(key)
+                self.condition.notify_all()
+
+    def wait(self):
+        """Wait until all pending calls have finished.
+        """
+        with self.condition:
+            while self.pending:
+                self.condition.wait()
+
+
+def iter_json_array(chunks):
+    """Decode a JSON array from an iterable of byte strings, yielding every
+    element as soon as it is complete. Only the current element is kept in
+    memory.
+    """
+    decoder = JsonArrayDecoder()
+    for chunk in chunks:
+        for value in decoder.feed(chunk):
+            yield value
+        if decoder.state == "end":
+            return
+    for value in decoder.feed(b"", done=True):
+        yield value
+
+
+class JsonArrayDecoder(object):
+    """Decode a JSON array that is received in chunks of bytes. See
+    :func:`iter_json_array`.
+    """
+
+    def __init__(self):
+        super(JsonArrayDecoder, self).__init__()
+        self.decoder = json.JSONDecoder()
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.state = "start"
+
+    def feed(self, chunk, done=False):
+        """Add the next chunk of bytes. Returns the elements that were
+        completed by it. ``done`` marks the end of the data.
+        """
+        buf = self.buf + self.text.decode(chunk, final=done)
+        state = self.state
+        values = []
+
+        pos = 0
+        while True:
+            pos = WHITESPACE.match(buf, pos).end()
+            if pos == len(buf) or state == "end":
+                break
+
+            if state == "start":
+                if buf[pos] != "[":
+                    raise ValueError("expected a JSON array")
+                pos += 1
+                state = "first"
+            elif state in ("first", "separator") and buf[pos] == "]":
+                pos += 1
+                state = "end"
+            elif state == "separator":
+                if buf[pos] != ",":
+                    raise ValueError("expected ',' or ']' at %r" % buf[pos])
+                pos += 1
+                state = "value"
+            else:
+                try:
+                    value, end = self.decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if done:
+                        raise
+                    break
+                if end == len(buf) and not done:
+                    # The value may continue in the next chunk.
+                    break
+                pos = end
+                state = "separator"
+                values.append(value)
+
+        self.buf = buf[pos:]
+        self.state = state
+        if done and state != "end":
+            raise ValueError("unexpected end of JSON array")
+        return values
+
+
+class SingleFlight(object):
+    """Deduplicate concurrent calls. While a call for a key is running, other
+    threads that make a call for the same key wait for it and get the same
+    result (or exception) instead of calling their own function.
+    """
+
+    def __init__(self):
+        super(SingleFlight, self).__init__()
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def call(self, key, func):
+        """Call ``func``, or wait for the running call for ``key``. Returns
+        the result of the call.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+
+        if not leader:
+            call.done.wait()
+            if call.exc_info is not None:
+                six.reraise(*call.exc_info)
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+class Call(object):
+    def __init__(self):
+        super(Call, self).__init__()
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+
+def merge_meta(metas):
+    """Combine the metadata of several responses for the same request.
+    """
+    if len(metas) == 1:
+        return metas[0]
+
+    meta = {}
+    for key in ("result_total", "page_size"):
+        values = [m[key] for m in metas if key in m]
+        if values:
+            meta[key] = values[0]
+    counts = [m["result_count"] for m in metas if "result_count" in m]
+    if counts:
+        meta["result_count"] = sum(counts)
+    return meta
+
+
 class ListWrapper(list):
     def __init__(self, endpoint, page, data, args):
         super(ListWrapper, self).__init__(data)
@@ -11,3 +240,48 @@ class ListWrapper(list):
 
     def next_page(self):
         return self.endpoint.page(self.page + 1, *self.args)
+
+
+def prefetch_map(func, items, prefetch):
+    """Like :func:`parallel_map`, but yield the results in order as they
+    become available. At most ``prefetch`` calls are made in the background
+    ahead of the result that is consumed.
+    """
+    items = iter(items)
+    if prefetch < 1:
+        for item in items:
+            yield func(item)
+        return
+
+    pool = ThreadPool(prefetch)
+    pending = collections.deque(
+        pool.apply_async(func, (item, ))
+        for item in itertools.islice(items, prefetch))
+    try:
+        while pending:
+            result = pending.popleft().get()
+            for item in itertools.islice(items, 1):
+                pending.append(pool.apply_async(func, (item, )))
+            yield result
+    finally:
+        pool.terminate()
+
+
+def iter_pages(first, prefetch=2):
+    """Iterate over ``first`` (a :class:`ListWrapper`) and the pages that
+    follow it, up to the ``page_total`` reported by the API.
+
+    While a page is being processed by the caller, up to ``prefetch`` of the
+    next pages are requested in the background.
+    """
+    yield first
+
+    total = (first.meta or {}).get("page_total")
+    if total is None:
+        return
+
+    def fetch(number):
+        return first.endpoint.page(number, *first.args)
+
+    for page in prefetch_map(fetch, range(first.page + 1, total), prefetch):
+        yield page
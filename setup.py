@@ -17,6 +17,7 @@ setup(name="gw2api",
       long_description=read("README.rst"),
       packages=["gw2api", "gw2api.v2"],
       install_requires=["requests", "six"],
+      extras_require={"async": ["aiohttp"]},
       classifiers=["Development Status :: 3 - Alpha",
                    "Environment :: Console",
                    "Environment :: Web Environment",
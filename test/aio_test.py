@@ -0,0 +1,296 @@
+import unittest
+import json
+
+import requests
+
+import gw2api
+import gw2api.v2
+
+try:
+    import asyncio
+    import gw2api.v2.aio
+    from mock_aiohttp import MockAsyncSession
+except (ImportError, SyntaxError):
+    asyncio = None
+
+from gw2api.cache import MemoryCache
+
+from mock_requests import MockSession, use_session
+
+
+@unittest.skipIf(asyncio is None, "asyncio is not available")
+class TestAsyncApi2(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.session = MockAsyncSession()
+        gw2api.v2.aio.set_session(self.session)
+
+    def tearDown(self):
+        self.loop.close()
+        gw2api.v2.aio.set_session(None)
+        gw2api.set_cache_backend(None)
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def add_response(self, path, response, params=None):
+        self.session.add_mock_response("get", gw2api.v2.BASE_URL + path,
+                                       json.dumps(response), params=params)
+
+    def test_endpoints(self):
+        self.assertIsInstance(gw2api.v2.aio.items,
+                              gw2api.v2.aio.AsyncLocaleAwareEndpoint)
+        self.assertEqual(gw2api.v2.aio.items.name, "items")
+        self.assertIsInstance(gw2api.v2.aio.account,
+                              gw2api.v2.aio.AsyncAccountEndpoint)
+        self.assertIsInstance(gw2api.v2.aio.account.achievements,
+                              gw2api.v2.aio.AsyncAccountAchievementsEndpoint)
+        self.assertIs(gw2api.v2.aio.recipe_search.recipe_endpoint,
+                      gw2api.v2.aio.recipes)
+
+    def test_get(self):
+        self.add_response("quaggans", ["404", "aloha"])
+        self.add_response("quaggans/aloha", {"id": "aloha"})
+        self.add_response("build", {"id": 1234})
+
+        quaggans = gw2api.v2.aio.quaggans
+        self.assertEqual(self.run_async(quaggans.get_ids()), ["404", "aloha"])
+        self.assertEqual(self.run_async(quaggans.get("aloha")), {"id": "aloha"})
+        self.assertEqual(self.run_async(gw2api.v2.aio.build.get()), 1234)
+
+    def test_get_many(self):
+        gw2api.set_cache_backend(MemoryCache())
+
+        self.add_response("items", [{"id": 2}, {"id": 1}],
+                          params={"ids": "1,2", "lang": "en"})
+        self.add_response("items", [{"id": 3}],
+                          params={"ids": "3", "lang": "en"})
+
+        items = gw2api.v2.aio.items
+        self.assertEqual(self.run_async(items.get([1, 2])), [{"id": 1}, {"id": 2}])
+        self.assertEqual(self.run_async(items.get(3, 2, 1)),
+                         [{"id": 3}, {"id": 2}, {"id": 1}])
+
+        # The cache is shared with the synchronous endpoints.
+        self.assertEqual(gw2api.v2.items.get_one(3), {"id": 3})
+
+    def test_page(self):
+        self.add_response("colors", [{"id": 1}, {"id": 2}],
+                          params={"page": 0, "page_size": 2, "lang": "en"})
+        self.add_response("colors", [{"id": 3}],
+                          params={"page": 1, "page_size": 2, "lang": "en"})
+
+        page = self.run_async(gw2api.v2.aio.colors.page(page_size=2))
+        self.assertEqual(page, [{"id": 1}, {"id": 2}])
+        self.assertEqual(self.run_async(page.next_page()), [{"id": 3}])
+
+    def test_error(self):
+        with self.assertRaises(requests.HTTPError) as context:
+            self.run_async(gw2api.v2.aio.quaggans.get_ids())
+        self.assertIn("404 Client Error", str(context.exception))
+
+    def test_stale_while_revalidate(self):
+        cache = MemoryCache()
+        gw2api.set_cache_backend(cache)
+        gw2api.set_cache_time(3600)
+        gw2api.set_stale_while_revalidate(600)
+        quaggans = gw2api.v2.aio.quaggans
+
+        try:
+            self.add_response("quaggans", ["404"])
+            self.assertEqual(self.run_async(quaggans.get_ids()), ["404"])
+
+            # An expired response is returned, and refreshed in the background.
+            cache.get("quaggans.json").timestamp -= 3700
+            self.add_response("quaggans", ["aloha"])
+            self.assertEqual(self.run_async(quaggans.get_ids()), ["404"])
+
+            for task in list(gw2api.v2.aio.refreshes.values()):
+                self.run_async(task)
+            self.assertEqual(gw2api.v2.aio.refreshes, {})
+            self.assertEqual(self.run_async(quaggans.get_ids()), ["aloha"])
+        finally:
+            gw2api.set_stale_while_revalidate(None)
+
+    def test_coalesce(self):
+        self.add_response("quaggans", ["404"])
+        self.add_response("items", [{"id": 1}],
+                          params={"ids": "1", "lang": "en"})
+        requests_made = []
+        get = self.session.get
+
+        def counting_get(url, **kwargs):
+            requests_made.append(url)
+            return get(url, **kwargs)
+        self.session.get = counting_get
+
+        tasks = [self.loop.create_task(coroutine) for coroutine in (
+            gw2api.v2.aio.quaggans.get_ids(),
+            gw2api.v2.aio.quaggans.get_ids(),
+            gw2api.v2.aio.items.get([1]),
+            gw2api.v2.aio.items.get([1]))]
+        results = self.run_async(asyncio.gather(*tasks))
+        self.assertEqual(results, [["404"], ["404"], [{"id": 1}], [{"id": 1}]])
+        self.assertEqual(len(requests_made), 2)
+        self.assertEqual(gw2api.v2.aio.in_flight, {})
+
+    def test_retry(self):
+        self.add_response("quaggans", ["404"])
+        gw2api.set_retries(3, backoff=0.001)
+        responses = []
+        get = self.session.get
+
+        def rate_limited_get(url, **kwargs):
+            response = get(url, **kwargs)
+            if not responses:
+                response.status = 429
+            responses.append(response)
+            return response
+        self.session.get = rate_limited_get
+
+        try:
+            self.assertEqual(self.run_async(gw2api.v2.aio.quaggans.get_ids()),
+                             ["404"])
+            self.assertEqual(len(responses), 2)
+        finally:
+            gw2api.set_retries(3, backoff=1.0)
+
+    def test_get_all_pages(self):
+        for page in range(3):
+            self.session.add_mock_response(
+                "get", gw2api.v2.BASE_URL + "colors",
+                json.dumps([{"id": page}]),
+                params={"page": page, "page_size": 200, "lang": "en"},
+                headers={"X-Page-Total": "3"})
+
+        colors = self.run_async(gw2api.v2.aio.colors.get_all_pages("en"))
+        self.assertEqual(colors, [{"id": 0}, {"id": 1}, {"id": 2}])
+
+    def test_get_all_fallback(self):
+        self.add_response("items", [1, 2])
+        self.add_response("items", [{"id": 1}, {"id": 2}],
+                          params={"ids": "1,2", "lang": "en"})
+
+        items = self.run_async(gw2api.v2.aio.items.get_all())
+        self.assertEqual(items, [{"id": 1}, {"id": 2}])
+
+    def collect(self, entities):
+        async def collect():
+            return [entity async for entity in entities]
+        return self.run_async(collect())
+
+    def test_iter_all(self):
+        cache = MemoryCache()
+        gw2api.set_cache_backend(cache)
+        colors = [{"id": i} for i in range(1, 6)]
+        self.add_response("colors", colors,
+                          params={"ids": "all", "lang": "de"})
+        self.add_response("quaggans", ["404", "aloha"], params={"ids": "all"})
+        endpoint = gw2api.v2.aio.colors
+        endpoint.max_ids = 2
+        endpoint.stream_chunk_size = 7
+        self.addCleanup(delattr, endpoint, "max_ids")
+        self.addCleanup(delattr, endpoint, "stream_chunk_size")
+
+        # The synchronous transport must not be used on the event loop.
+        sync_session = MockSession()
+        sync_session.get = None
+        use_session(self, sync_session)
+
+        self.assertEqual(self.collect(endpoint.iter_all(lang="de")), colors)
+        self.assertEqual(cache.get("colors.de.5.json").value,
+                         {"meta": {}, "data": colors[4]})
+        self.assertEqual(self.collect(gw2api.v2.aio.quaggans.iter_all()),
+                         ["404", "aloha"])
+
+        with self.assertRaises(requests.HTTPError):
+            self.collect(gw2api.v2.aio.minis.iter_all())
+
+        # Items do not support ids=all.
+        items = gw2api.v2.aio.items
+        items.max_ids = 2
+        self.addCleanup(delattr, items, "max_ids")
+        self.add_response("items", [1, 2, 3])
+        self.add_response("items", [{"id": 1}, {"id": 2}],
+                          params={"ids": "1,2", "lang": "en"})
+        self.add_response("items", [{"id": 3}],
+                          params={"ids": "3", "lang": "en"})
+        self.assertEqual(self.collect(items.iter_all()),
+                         [{"id": 1}, {"id": 2}, {"id": 3}])
+
+    def test_iter_pages(self):
+        for page in range(3):
+            self.session.add_mock_response(
+                "get", gw2api.v2.BASE_URL + "colors",
+                json.dumps([{"id": page}]),
+                params={"page": page, "page_size": 1, "lang": "de"},
+                headers={"x-page-total": "3"})
+
+        pages = self.collect(gw2api.v2.aio.colors.iter_pages(
+            1, "de", prefetch=1))
+        self.assertEqual([page.page for page in pages], [0, 1, 2])
+        self.assertEqual([list(page) for page in pages],
+                         [[{"id": 0}], [{"id": 1}], [{"id": 2}]])
+
+        # Without a page total, only the first page is returned.
+        self.add_response("quaggans", ["404"],
+                          params={"page": 0, "page_size": 20})
+        pages = self.collect(gw2api.v2.aio.quaggans.iter_pages())
+        self.assertEqual(pages, [["404"]])
+
+    def test_build_check(self):
+        build_tracker = gw2api.v2.endpoint.build_tracker
+        cache = MemoryCache()
+        gw2api.set_cache_backend(cache)
+        gw2api.set_build_check_interval(60)
+        build_tracker.reset()
+        self.addCleanup(gw2api.set_build_check_interval, None)
+        self.addCleanup(build_tracker.reset)
+
+        # The synchronous transport must not be used on the event loop.
+        sync_session = MockSession()
+        sync_session.get = None
+        use_session(self, sync_session)
+
+        self.add_response("build", {"id": 100})
+        self.add_response("items/1", {"id": 1}, params={"lang": "en"})
+        item = self.run_async(gw2api.v2.aio.items.get_one(1))
+        self.assertEqual(item, {"id": 1})
+        self.assertEqual(build_tracker.build_id, 100)
+        self.assertEqual(cache.get("items.en.1.json").info, {"build": 100})
+
+        # A new build invalidates the entry.
+        self.add_response("build", {"id": 101})
+        self.add_response("items/1", {"id": 2}, params={"lang": "en"})
+        self.assertEqual(self.run_async(gw2api.v2.aio.items.get_one(1)),
+                         {"id": 1})
+        build_tracker.checked = 0
+        self.assertEqual(self.run_async(gw2api.v2.aio.items.get_one(1)),
+                         {"id": 2})
+        self.assertEqual(build_tracker.build_id, 101)
+
+    def test_get_all_rejected(self):
+        get_mock_response = self.session.get_mock_response
+
+        def reject_all(method, url, params=None):
+            response = get_mock_response(method, url, params)
+            if params and params.get("ids") == "all":
+                response.status_code = 400
+            return response
+
+        self.session.get_mock_response = reject_all
+        minis = gw2api.v2.aio.minis
+        self.addCleanup(setattr, minis, "supports_all", None)
+        self.add_response("minis", {"text": "invalid lang"},
+                          params={"ids": "all", "lang": "en"})
+        with self.assertRaises(requests.HTTPError):
+            self.run_async(minis.get_all())
+        self.assertIsNone(minis.supports_all)
+
+        self.add_response("minis", {"text": "all ids not supported"},
+                          params={"ids": "all", "lang": "en"})
+        self.add_response("minis", [1])
+        self.add_response("minis", [{"id": 1}],
+                          params={"ids": "1", "lang": "en"})
+        self.assertEqual(self.run_async(minis.get_all()), [{"id": 1}])
+        self.assertIs(minis.supports_all, False)
@@ -0,0 +1,421 @@
+import unittest
+import os
+import time
+import json
+import shutil
+import tempfile
+import threading
+
+from gw2api.cache import (CacheEntry, FileCache, MemoryCache, TieredCache,
+                          SqliteCache)
+
+
+class CacheBackendTests(object):
+    def create_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = self.create_backend()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.cache.get("test.json"))
+        self.assertFalse(self.cache.contains("test.json"))
+
+        self.cache.set("test.json", {"foo": ["bar", 1]})
+        entry = self.cache.get("test.json")
+        self.assertEqual(entry.value, {"foo": ["bar", 1]})
+        self.assertTrue(self.cache.contains("test.json"))
+
+        self.cache.delete("test.json")
+        self.assertIsNone(self.cache.get("test.json"))
+        self.assertFalse(self.cache.contains("test.json"))
+
+        # Deleting a missing key is not an error.
+        self.cache.delete("test.json")
+
+    def test_expiry(self):
+        now = time.time()
+        self.cache.set("fresh.json", [1], expires=now + 3600,
+                       info={"build": 1})
+        self.cache.set("expired.json", [2], expires=now - 1)
+
+        entry = self.cache.get("fresh.json")
+        self.assertAlmostEqual(entry.expires, now + 3600, places=2)
+        self.assertEqual(entry.info, {"build": 1})
+        self.assertTrue(entry.is_fresh())
+        self.assertTrue(self.cache.contains("fresh.json", 60))
+
+        # Expired entries are still returned, but are not fresh.
+        entry = self.cache.get("expired.json")
+        self.assertEqual(entry.value, [2])
+        self.assertFalse(entry.is_fresh())
+        self.assertFalse(self.cache.contains("expired.json"))
+
+    def test_touch(self):
+        self.cache.set("test.json", [1], expires=time.time() - 1)
+        self.assertFalse(self.cache.contains("test.json"))
+
+        self.cache.touch("test.json", expires=time.time() + 60,
+                         info={"build": 2})
+        entry = self.cache.get("test.json")
+        self.assertEqual(entry.value, [1])
+        self.assertEqual(entry.info, {"build": 2})
+        self.assertTrue(entry.is_fresh())
+
+        # Touching a missing key does not create it.
+        self.cache.touch("missing.json")
+        self.assertIsNone(self.cache.get("missing.json"))
+
+    def test_get_set_many(self):
+        self.cache.set_many({"a.json": [1], "b.json": [2]})
+        self.cache.set_many([("c.json", [3])], expires=time.time() + 60)
+
+        entries = self.cache.get_many(["a.json", "c.json", "d.json"])
+        self.assertEqual(sorted(entries.keys()), ["a.json", "c.json"])
+        self.assertEqual(entries["a.json"].value, [1])
+        self.assertIsNotNone(entries["c.json"].expires)
+
+    def test_max_age(self):
+        self.cache.set("test.json", [1])
+        self.assertTrue(self.cache.contains("test.json", 60))
+        self.assertTrue(self.cache.get("test.json").is_fresh(60))
+
+        later = time.time() + 120
+        self.assertFalse(self.cache.get("test.json").is_fresh(60, later))
+
+
+class TestFileCache(CacheBackendTests, unittest.TestCase):
+    def create_backend(self):
+        return FileCache(self.temp_dir)
+
+    def test_legacy_file(self):
+        with open(os.path.join(self.temp_dir, "legacy.json"), "w") as fp:
+            json.dump({"meta": {}, "data": [1, 2, 3]}, fp, indent=2)
+
+        entry = self.cache.get("legacy.json")
+        self.assertEqual(entry.value, {"meta": {}, "data": [1, 2, 3]})
+        self.assertIsNone(entry.expires)
+        self.assertTrue(self.cache.contains("legacy.json", 60))
+
+    def test_corrupt_file(self):
+        with open(os.path.join(self.temp_dir, "corrupt.json"), "w") as fp:
+            fp.write("{\"meta\": {}, \"da")
+
+        self.assertIsNone(self.cache.get("corrupt.json"))
+
+    def test_atomic_write(self):
+        self.cache.set("test.json", [1])
+        self.cache.set("test.json", [2])
+        self.assertEqual(self.cache.get("test.json").value, [2])
+
+        # No temporary files are left behind.
+        self.assertEqual(os.listdir(self.temp_dir), ["test.json"])
+
+    def test_failed_write(self):
+        self.cache.set("test.json", [1])
+        with self.assertRaises(TypeError):
+            self.cache.set("test.json", object())
+
+        self.assertEqual(self.cache.get("test.json").value, [1])
+        self.assertEqual(os.listdir(self.temp_dir), ["test.json"])
+
+    @unittest.skipIf(os.name != "posix", "requires fcntl")
+    def test_locked(self):
+        cache = FileCache(self.temp_dir, locking=True)
+        order = []
+
+        def worker():
+            with cache.locked("test.json"):
+                order.append("worker")
+
+        with cache.locked("test.json"):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            time.sleep(0.1)
+            order.append("main")
+        thread.join()
+
+        self.assertEqual(order, ["main", "worker"])
+        # Lock files are removed when the lock is released.
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+        # Other keys are not blocked.
+        with cache.locked("a.json"):
+            with cache.locked("b.json"):
+                self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                                 ["a.json.lock", "b.json.lock"])
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    @unittest.skipIf(os.name != "posix", "requires fcntl")
+    def test_locked_contention(self):
+        cache = FileCache(self.temp_dir, locking=True)
+        holders = []
+        overlaps = []
+
+        def worker():
+            for i in range(20):
+                with cache.locked("test.json"):
+                    holders.append(1)
+                    if len(holders) > 1:
+                        overlaps.append(1)
+                    time.sleep(0.001)
+                    holders.pop()
+
+        threads = [threading.Thread(target=worker) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(overlaps, [])
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+
+class TestZlibFileCache(CacheBackendTests, unittest.TestCase):
+    def create_backend(self):
+        return FileCache(self.temp_dir, "zlib")
+
+    def test_compressed(self):
+        value = [{"id": i, "name": "Item %d" % i} for i in range(100)]
+        self.cache.set("zlib.json", value)
+        FileCache(self.temp_dir).set("json.json", value)
+
+        size = os.path.getsize(os.path.join(self.temp_dir, "zlib.json"))
+        json_size = os.path.getsize(os.path.join(self.temp_dir, "json.json"))
+        self.assertLess(size * 5, json_size)
+
+    def test_mixed_encodings(self):
+        # Files are read with the encoding in their header.
+        for encoding in ("json", "zlib", "marshal"):
+            FileCache(self.temp_dir, encoding).set(encoding, [encoding])
+            self.assertEqual(self.cache.get(encoding).value, [encoding])
+
+    def test_corrupt_file(self):
+        self.cache.set("corrupt.json", [1, 2, 3])
+        path = os.path.join(self.temp_dir, "corrupt.json")
+        with open(path, "rb") as fp:
+            data = fp.read()
+        with open(path, "wb") as fp:
+            fp.write(data[:-4])
+
+        self.assertIsNone(self.cache.get("corrupt.json"))
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            FileCache(self.temp_dir, "foo")
+
+
+class TestMarshalFileCache(CacheBackendTests, unittest.TestCase):
+    def create_backend(self):
+        return FileCache(self.temp_dir, "marshal")
+
+
+class TestMemoryCache(CacheBackendTests, unittest.TestCase):
+    def create_backend(self):
+        return MemoryCache()
+
+
+class TestLimitedMemoryCache(CacheBackendTests, unittest.TestCase):
+    def create_backend(self):
+        return MemoryCache(max_entries=10, max_bytes=1000)
+
+    def test_max_entries(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        # "b" was the least recently used entry.
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a").value, 1)
+        self.assertEqual(cache.get("c").value, 3)
+
+    def test_max_bytes(self):
+        cache = MemoryCache(max_bytes=20)
+        cache.set("a", "x" * 8)
+        cache.set("b", "y" * 8)
+        self.assertEqual(cache.stats()["bytes"], 20)
+
+        cache.set("c", "z" * 8)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["entries"], 2)
+
+        cache.set("b", "y")
+        self.assertEqual(cache.stats()["bytes"], 13)
+
+    def test_stats(self):
+        cache = MemoryCache()
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("a")
+        cache.get("b")
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+
+        # Expired entries are not hits.
+        cache.set("c", 3, expires=time.time() - 1)
+        self.assertEqual(cache.get("c").value, 3)
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    def test_touch_recency(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.touch("a")
+        cache.set("c", 3)
+
+        # Touching "a" made "b" the least recently used entry.
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a").value, 1)
+
+
+class TestTieredCache(CacheBackendTests, unittest.TestCase):
+    def create_backend(self):
+        return TieredCache(MemoryCache(max_entries=10),
+                           FileCache(self.temp_dir))
+
+    def test_promotion(self):
+        self.assertEqual(self.cache.directory, self.temp_dir)
+
+        back = self.cache.back
+        back.set("test.json", [1, 2], expires=time.time() + 60)
+        timestamp = back.get("test.json").timestamp
+
+        entry = self.cache.get("test.json")
+        self.assertEqual(entry.value, [1, 2])
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+        # The second lookup is served from memory, keeping the timestamp.
+        os.unlink(os.path.join(self.temp_dir, "test.json"))
+        entry = self.cache.get("test.json")
+        self.assertEqual(entry.value, [1, 2])
+        self.assertEqual(entry.timestamp, timestamp)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_refresh_from_backend(self):
+        self.cache.set("test.json", [1], expires=time.time() - 1)
+        self.cache.back.set("test.json", [2], expires=time.time() + 60)
+
+        self.assertEqual(self.cache.get("test.json").value, [2])
+
+    def test_expired_stats(self):
+        self.cache.set("test.json", [1], expires=time.time() - 1)
+        self.cache.get("test.json")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 1))
+
+
+class CountingSqliteCache(SqliteCache):
+    def __init__(self, filename):
+        super(CountingSqliteCache, self).__init__(filename)
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append("get")
+        return super(CountingSqliteCache, self).get(key)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        self.calls.append(("get_many", len(keys)))
+        return super(CountingSqliteCache, self).get_many(keys)
+
+    def set_many(self, items, expires=None, info=None):
+        items = list(items)
+        self.calls.append(("set_many", len(items)))
+        super(CountingSqliteCache, self).set_many(items, expires, info)
+
+
+class TestTieredSqliteCache(CacheBackendTests, unittest.TestCase):
+    def create_backend(self):
+        return TieredCache(MemoryCache(max_entries=100),
+                           CountingSqliteCache(":memory:"))
+
+    def test_batching(self):
+        back = self.cache.back
+        keys = ["%d.json" % i for i in range(100)]
+        self.cache.set_many((key, i) for i, key in enumerate(keys))
+        self.assertEqual(back.calls, [("set_many", 100)])
+
+        # Hits are served from memory, only the misses go to the backend.
+        self.cache.front.delete("0.json")
+        self.cache.front.delete("1.json")
+        del back.calls[:]
+        entries = self.cache.get_many(keys + ["missing.json"])
+        self.assertEqual(len(entries), 100)
+        self.assertEqual(entries["1.json"].value, 1)
+        self.assertEqual(back.calls, [("get_many", 3)])
+
+        # Entries from the backend are promoted.
+        del back.calls[:]
+        self.assertEqual(len(self.cache.get_many(keys)), 100)
+        self.assertEqual(back.calls, [])
+
+    def test_batch(self):
+        with self.assertRaises(KeyError):
+            with self.cache.batch():
+                self.cache.set("a.json", [1])
+                raise KeyError("a.json")
+        self.assertIsNone(self.cache.back.get("a.json"))
+
+
+class TestSqliteCache(CacheBackendTests, unittest.TestCase):
+    def create_backend(self):
+        return SqliteCache(os.path.join(self.temp_dir, "cache.sqlite"))
+
+
+    def test_batch(self):
+        with self.cache.batch():
+            self.cache.set("a.json", [1])
+            with self.cache.batch():
+                self.cache.set("b.json", [2])
+        self.assertEqual(len(self.cache.get_many(["a.json", "b.json"])), 2)
+
+        with self.assertRaises(KeyError):
+            with self.cache.batch():
+                self.cache.set("c.json", [3])
+                raise KeyError("c.json")
+        self.assertIsNone(self.cache.get("c.json"))
+
+    def test_many_keys(self):
+        keys = ["%d.json" % i for i in range(1200)]
+        self.cache.set_many((key, i) for i, key in enumerate(keys))
+        self.assertEqual(len(self.cache.get_many(keys)), 1200)
+
+    def test_prune(self):
+        self.cache.set("a.json", [1], expires=time.time() - 1)
+        self.cache.set("b.json", [2], expires=time.time() + 60)
+        self.cache.set("c.json", [3])
+
+        self.assertEqual(self.cache.prune(), 1)
+        self.assertIsNone(self.cache.get("a.json"))
+        self.assertIsNotNone(self.cache.get("b.json"))
+        self.assertIsNotNone(self.cache.get("c.json"))
+
+    def test_persistence(self):
+        self.cache.set("test.json", {"foo": "bar"})
+        self.cache.close()
+
+        cache = self.create_backend()
+        self.assertEqual(cache.get("test.json").value, {"foo": "bar"})
+        cache.close()
+
+
+class TestCacheEntry(unittest.TestCase):
+    def test_is_fresh(self):
+        entry = CacheEntry([], timestamp=100, expires=200)
+        self.assertTrue(entry.is_fresh(now=150))
+        self.assertTrue(entry.is_fresh(60, now=150))
+        self.assertFalse(entry.is_fresh(10, now=150))
+        self.assertFalse(entry.is_fresh(now=200))
+
+        entry = CacheEntry([], timestamp=100)
+        self.assertTrue(entry.is_fresh(now=1e10))
@@ -3,29 +3,37 @@ import os
 import tempfile
 import json
 import shutil
+import threading
+import time
+
+import requests
+import six
 
 import gw2api
 import gw2api.v2
 
-from mock_requests import MockSession
+from gw2api.cache import MemoryCache, FileCache
 
+from mock_requests import MockSession, MockApi, use_session
 
-class TestCache2(unittest.TestCase):
-    def test_cache(self):
-        class CacheMockSession(MockSession):
-            def __init__(self):
-                super(CacheMockSession, self).__init__()
-                self.get_called = 0
 
-            def get(self, url, **kwargs):
-                self.get_called += 1
-                return super(CacheMockSession, self).get(url, **kwargs)
+class CountingMockSession(MockSession):
+    def __init__(self):
+        super(CountingMockSession, self).__init__()
+        self.get_called = 0
+
+    def get(self, url, **kwargs):
+        self.get_called += 1
+        return super(CountingMockSession, self).get(url, **kwargs)
 
+
+class TestCache2(unittest.TestCase):
+    def test_cache(self):
         saved_session = gw2api.session
 
         quaggans = ["404", "aloha", "attack", "bear"]
 
-        session = CacheMockSession()
+        session = CountingMockSession()
         session.add_mock_response("get", gw2api.v2.BASE_URL + "quaggans",
                                   json.dumps(quaggans))
 
@@ -76,3 +84,601 @@ class TestCache2(unittest.TestCase):
             shutil.rmtree(cache_dir, ignore_errors=True)
             gw2api.set_cache_dir(None)
             gw2api.set_session(saved_session)
+
+    def test_cache_backend(self):
+        saved_session = gw2api.session
+
+        session = CountingMockSession()
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "quaggans",
+                                  json.dumps(["404", "aloha"]))
+
+        try:
+            gw2api.set_cache_backend(MemoryCache())
+            gw2api.set_cache_time(3600)
+            gw2api.set_session(session)
+
+            self.assertIsNone(gw2api.cache_dir)
+            self.assertFalse(gw2api.v2.quaggans.has_cached("quaggans.json"))
+
+            response = gw2api.v2.quaggans.get_ids()
+            self.assertEqual(response, ["404", "aloha"])
+            self.assertEqual(session.get_called, 1, "invalid request count")
+            self.assertTrue(gw2api.v2.quaggans.has_cached("quaggans.json"))
+
+            response = gw2api.v2.quaggans.get_ids()
+            self.assertEqual(response, ["404", "aloha"])
+            self.assertEqual(session.get_called, 1, "invalid request count")
+
+        finally:
+            gw2api.set_cache_backend(None)
+            gw2api.set_session(saved_session)
+
+    def test_entity_cache(self):
+        saved_session = gw2api.session
+
+        def item(id):
+            return {"id": id, "name": "Item %d" % id}
+
+        session = CountingMockSession()
+        url = gw2api.v2.BASE_URL + "items"
+        session.add_mock_response("get", url,
+                                  json.dumps([item(3), item(1), item(2)]),
+                                  params={"ids": "1,2,3", "lang": "en"})
+        session.add_mock_response("get", url, json.dumps([item(4)]),
+                                  params={"ids": "4", "lang": "en"})
+
+        try:
+            gw2api.set_cache_backend(MemoryCache())
+            gw2api.set_cache_time(3600)
+            gw2api.set_session(session)
+
+            # Entities are returned in the requested order.
+            response = gw2api.v2.items.get([1, 2, 3])
+            self.assertEqual(response, [item(1), item(2), item(3)])
+            self.assertEqual(session.get_called, 1, "invalid request count")
+
+            # Only the ids that are not cached are requested.
+            response = gw2api.v2.items.get(2, 3, 4)
+            self.assertEqual(response, [item(2), item(3), item(4)])
+            self.assertEqual(session.get_called, 2, "invalid request count")
+
+            # Single entities are cached under the same name.
+            self.assertTrue(gw2api.v2.items.has_cached("items.en.2.json"))
+            self.assertEqual(gw2api.v2.items.get_one(2), item(2))
+            self.assertEqual(gw2api.v2.items.get(["4", "1", "4"]),
+                             [item(4), item(1)])
+            self.assertEqual(session.get_called, 2, "invalid request count")
+
+        finally:
+            gw2api.set_cache_backend(None)
+            gw2api.set_session(saved_session)
+
+    def test_entity_without_id(self):
+        saved_session = gw2api.session
+
+        characters = [{"name": "Two"}, {"name": "One"}]
+        session = CountingMockSession()
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "characters",
+                                  json.dumps(characters),
+                                  params={"ids": "One,Two"})
+
+        try:
+            gw2api.set_cache_backend(MemoryCache())
+            gw2api.set_session(session)
+
+            response = gw2api.v2.characters.get("One", "Two")
+            self.assertEqual(response, characters)
+
+        finally:
+            gw2api.set_cache_backend(None)
+            gw2api.set_session(saved_session)
+
+    def test_chunked_get(self):
+        saved_session = gw2api.session
+
+        session = CountingMockSession()
+        url = gw2api.v2.BASE_URL + "colors"
+        for ids in ("1,2", "3,4", "5"):
+            colors = [{"id": int(id)} for id in reversed(ids.split(","))]
+            session.add_mock_response("get", url, json.dumps(colors),
+                                      params={"ids": ids, "lang": "en"})
+
+        endpoint = gw2api.v2.LocaleAwareEndpoint("colors")
+        endpoint.max_ids = 2
+
+        try:
+            gw2api.set_session(session)
+
+            response = endpoint.get([1, 2, 3, 4, 5])
+            self.assertEqual([c["id"] for c in response], [1, 2, 3, 4, 5])
+            self.assertEqual(session.get_called, 3, "invalid request count")
+
+        finally:
+            gw2api.set_session(saved_session)
+
+    def test_build_versioning(self):
+        saved_session = gw2api.session
+
+        session = CountingMockSession()
+        build_url = gw2api.v2.BASE_URL + "build"
+        session.add_mock_response("get", build_url, json.dumps({"id": 100}))
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "items/1",
+                                  json.dumps({"id": 1}),
+                                  params={"lang": "en"})
+
+        cache = MemoryCache()
+        build_tracker = gw2api.v2.endpoint.build_tracker
+
+        try:
+            gw2api.set_cache_backend(cache)
+            gw2api.set_cache_time(3600)
+            gw2api.set_build_check_interval(3600)
+            gw2api.set_session(session)
+            build_tracker.reset()
+
+            self.assertEqual(gw2api.v2.items.get_one(1), {"id": 1})
+            self.assertEqual(session.get_called, 2, "invalid request count")
+
+            entry = cache.get("items.en.1.json")
+            self.assertEqual(entry.info, {"build": 100})
+            self.assertIsNone(entry.expires)
+
+            # Older than cache_time, but still valid for the same build.
+            entry.timestamp = 0
+            self.assertEqual(gw2api.v2.items.get_one(1), {"id": 1})
+            self.assertTrue(gw2api.v2.items.has_cached("items.en.1.json"))
+            self.assertEqual(session.get_called, 2, "invalid request count")
+
+            # Endpoints that are not versioned use cache_time.
+            self.assertFalse(gw2api.v2.prices.versioned)
+            self.assertTrue(gw2api.v2.recipe_search.versioned)
+
+            # A new build invalidates all entries at once.
+            session.add_mock_response("get", build_url,
+                                      json.dumps({"id": 101}))
+            build_tracker.checked = 0
+            self.assertFalse(gw2api.v2.items.has_cached("items.en.1.json"))
+            self.assertEqual(session.get_called, 3, "invalid request count")
+
+            self.assertEqual(gw2api.v2.items.get_one(1), {"id": 1})
+            self.assertEqual(session.get_called, 4, "invalid request count")
+            self.assertEqual(cache.get("items.en.1.json").info,
+                             {"build": 101})
+
+        finally:
+            gw2api.set_cache_backend(None)
+            gw2api.set_build_check_interval(None)
+            gw2api.set_session(saved_session)
+            build_tracker.reset()
+
+    def test_revalidation(self):
+        class ConditionalMockSession(CountingMockSession):
+            etag = "\"abc\""
+
+            def get(self, url, **kwargs):
+                self.get_called += 1
+                self.headers = kwargs.get("headers") or {}
+
+                response = requests.Response()
+                if self.headers.get("If-None-Match") == self.etag:
+                    response.status_code = 304
+                else:
+                    response.status_code = 200
+                    response.raw = six.BytesIO(b"[\"404\", \"aloha\"]")
+                response.headers["ETag"] = self.etag
+                response.headers["Last-Modified"] = \
+                    "Wed, 21 Oct 2015 07:28:00 GMT"
+                return response
+
+        saved_session = gw2api.session
+        session = ConditionalMockSession()
+        cache = MemoryCache()
+
+        try:
+            gw2api.set_cache_backend(cache)
+            gw2api.set_cache_time(3600)
+            gw2api.set_session(session)
+
+            response = gw2api.v2.quaggans.get_ids()
+            self.assertEqual(response, ["404", "aloha"])
+            self.assertEqual(response.meta["etag"], "\"abc\"")
+            self.assertNotIn("If-None-Match", session.headers)
+
+            # Expire the entry, the next request should be conditional.
+            cache.get("quaggans.json").timestamp = 0
+            response = gw2api.v2.quaggans.get_ids()
+            self.assertEqual(response, ["404", "aloha"])
+            self.assertEqual(session.get_called, 2, "invalid request count")
+            self.assertEqual(session.headers["If-None-Match"], "\"abc\"")
+            self.assertEqual(session.headers["If-Modified-Since"],
+                             "Wed, 21 Oct 2015 07:28:00 GMT")
+
+            # The 304 response refreshed the entry.
+            self.assertTrue(gw2api.v2.quaggans.has_cached("quaggans.json"))
+            gw2api.v2.quaggans.get_ids()
+            self.assertEqual(session.get_called, 2, "invalid request count")
+
+            # A changed resource is downloaded and stored again.
+            session.etag = "\"def\""
+            cache.get("quaggans.json").timestamp = 0
+            response = gw2api.v2.quaggans.get_ids()
+            self.assertEqual(session.get_called, 3, "invalid request count")
+            self.assertEqual(response.meta["etag"], "\"def\"")
+
+        finally:
+            gw2api.set_cache_backend(None)
+            gw2api.set_session(saved_session)
+
+    def test_stale_while_revalidate(self):
+        saved_session = gw2api.session
+
+        session = CountingMockSession()
+        url = gw2api.v2.BASE_URL + "quaggans"
+        session.add_mock_response("get", url, json.dumps(["404"]))
+        cache = MemoryCache()
+
+        try:
+            gw2api.set_cache_backend(cache)
+            gw2api.set_cache_time(3600)
+            gw2api.set_stale_while_revalidate(600)
+            gw2api.set_session(session)
+
+            self.assertEqual(gw2api.v2.quaggans.get_ids(), ["404"])
+            self.assertEqual(session.get_called, 1, "invalid request count")
+
+            # An expired response is returned, and refreshed in the background.
+            session.add_mock_response("get", url, json.dumps(["aloha"]))
+            cache.get("quaggans.json").timestamp -= 3700
+            self.assertEqual(gw2api.v2.quaggans.get_ids(), ["404"])
+            gw2api.v2.endpoint.refresher.wait()
+            self.assertEqual(session.get_called, 2, "invalid request count")
+            self.assertEqual(gw2api.v2.quaggans.get_ids(), ["aloha"])
+
+            # Responses that are too old are not returned.
+            session.add_mock_response("get", url, json.dumps(["bear"]))
+            cache.get("quaggans.json").timestamp -= 4300
+            self.assertEqual(gw2api.v2.quaggans.get_ids(), ["bear"])
+            self.assertEqual(session.get_called, 3, "invalid request count")
+
+        finally:
+            gw2api.set_cache_backend(None)
+            gw2api.set_stale_while_revalidate(None)
+            gw2api.set_session(saved_session)
+
+    def test_cache_policies(self):
+        saved_session = gw2api.session
+
+        session = CountingMockSession()
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "quaggans",
+                                  json.dumps(["404"]))
+        cache = MemoryCache()
+
+        try:
+            gw2api.set_cache_backend(cache)
+            gw2api.set_cache_time(3600)
+            gw2api.set_session(session)
+
+            gw2api.set_cache_policy("commerce/*", 60)
+            gw2api.set_cache_policy("commerce/prices", 30)
+            self.assertEqual(gw2api.get_cache_time("commerce/prices"), 30)
+            self.assertEqual(gw2api.get_cache_time("commerce/listings"), 60)
+            self.assertEqual(gw2api.get_cache_time("items"), 3600)
+            self.assertEqual(gw2api.v2.prices.get_cache_time(), 30)
+
+            # Disable caching for quaggans.
+            gw2api.set_cache_policy("quaggans", 0)
+            gw2api.v2.quaggans.get_ids()
+            gw2api.v2.quaggans.get_ids()
+            self.assertEqual(session.get_called, 2, "invalid request count")
+            self.assertIsNone(cache.get("quaggans.json"))
+
+            # A cache time set on the endpoint takes precedence.
+            gw2api.v2.quaggans.cache_time = 120
+            gw2api.v2.quaggans.get_ids()
+            gw2api.v2.quaggans.get_ids()
+            self.assertEqual(session.get_called, 3, "invalid request count")
+
+            entry = cache.get("quaggans.json")
+            self.assertAlmostEqual(entry.expires, entry.timestamp + 120,
+                                   places=2)
+            entry.timestamp -= 180
+            self.assertFalse(gw2api.v2.quaggans.has_cached("quaggans.json"))
+
+        finally:
+            gw2api.v2.quaggans.cache_time = None
+            gw2api.set_cache_policy("commerce/*", None)
+            gw2api.set_cache_policy("commerce/prices", None)
+            gw2api.set_cache_policy("quaggans", None)
+            gw2api.set_cache_backend(None)
+            gw2api.set_session(saved_session)
+
+    @unittest.skipIf(os.name != "posix", "requires fcntl")
+    def test_locked_refresh(self):
+        saved_session = gw2api.session
+
+        session = CountingMockSession()
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "quaggans",
+                                  json.dumps(["404"]))
+        cache_dir = tempfile.mkdtemp()
+        cache = FileCache(cache_dir, locking=True)
+        results = []
+
+        def worker():
+            results.append(gw2api.v2.quaggans.get_ids())
+
+        try:
+            gw2api.set_cache_backend(cache)
+            gw2api.set_cache_time(3600)
+            gw2api.set_session(session)
+
+            # While another client refreshes the entry, the worker waits for
+            # it instead of making the same request.
+            with cache.locked("quaggans.json"):
+                thread = threading.Thread(target=worker)
+                thread.start()
+                time.sleep(0.1)
+                cache.set("quaggans.json", {"meta": {}, "data": ["aloha"]},
+                          expires=time.time() + 3600)
+            thread.join()
+
+            self.assertEqual(results, [["aloha"]])
+            self.assertEqual(session.get_called, 0, "invalid request count")
+
+        finally:
+            gw2api.set_cache_backend(None)
+            gw2api.set_session(saved_session)
+            shutil.rmtree(cache_dir)
+
+    def test_coalesce_requests(self):
+        saved_session = gw2api.session
+
+        class SlowMockSession(CountingMockSession):
+            def get(self, url, **kwargs):
+                time.sleep(0.1)
+                return super(SlowMockSession, self).get(url, **kwargs)
+
+        session = SlowMockSession()
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "quaggans",
+                                  json.dumps(["404"]))
+        results = []
+
+        def worker():
+            results.append(gw2api.v2.quaggans.get_ids())
+
+        try:
+            gw2api.set_cache_backend(MemoryCache())
+            gw2api.set_cache_time(3600)
+            gw2api.set_session(session)
+
+            threads = [threading.Thread(target=worker) for i in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(results, [["404"]] * 10)
+            self.assertEqual(session.get_called, 1, "invalid request count")
+
+        finally:
+            gw2api.set_cache_backend(None)
+            gw2api.set_session(saved_session)
+
+    def test_iter_all(self):
+        saved_session = gw2api.session
+
+        items = [{"id": i, "name": "Item %d" % i} for i in range(1, 6)]
+        session = CountingMockSession()
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "colors",
+                                  json.dumps(items),
+                                  params={"ids": "all", "lang": "de"})
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "quaggans",
+                                  json.dumps(["404", "aloha"]),
+                                  params={"ids": "all"})
+        cache = MemoryCache()
+
+        try:
+            gw2api.set_cache_backend(cache)
+            gw2api.set_cache_time(3600)
+            gw2api.set_session(session)
+            gw2api.v2.colors.max_ids = 2
+            gw2api.v2.colors.stream_chunk_size = 7
+
+            entities = gw2api.v2.colors.iter_all(lang="de")
+            self.assertEqual(next(entities), items[0])
+            self.assertEqual(list(entities), items[1:])
+
+            # The entities were cached one by one.
+            self.assertEqual(cache.get("colors.de.5.json").value,
+                             {"meta": {}, "data": items[4]})
+            self.assertEqual(gw2api.v2.colors.get([4, 5], lang="de"),
+                             items[3:])
+            self.assertEqual(session.get_called, 1, "invalid request count")
+
+            # Responses without ids are returned, but not cached.
+            self.assertEqual(list(gw2api.v2.quaggans.iter_all()),
+                             ["404", "aloha"])
+            self.assertEqual(cache.stats()["entries"], 5)
+
+            with self.assertRaises(requests.HTTPError):
+                list(gw2api.v2.skins.iter_all())
+
+        finally:
+            del gw2api.v2.colors.max_ids
+            del gw2api.v2.colors.stream_chunk_size
+            gw2api.set_cache_backend(None)
+            gw2api.set_session(saved_session)
+
+    def test_iter_pages(self):
+        saved_session = gw2api.session
+
+        session = CountingMockSession()
+        history_url = gw2api.v2.BASE_URL + "commerce/transactions/history/buys"
+        for page in range(4):
+            data = [{"id": page * 2 + 1}, {"id": page * 2 + 2}]
+            session.add_mock_response(
+                "get", gw2api.v2.BASE_URL + "colors", json.dumps(data),
+                params={"page": page, "page_size": 2, "lang": "en"},
+                headers={"X-Page-Total": "4", "X-Page-Size": "2"})
+            session.add_mock_response(
+                "get", history_url, json.dumps(data),
+                params={"page": page, "page_size": 2},
+                headers={"X-Page-Total": "4"})
+        session.add_mock_response(
+            "get", gw2api.v2.BASE_URL + "quaggans", json.dumps(["404"]),
+            params={"page": 0, "page_size": 20})
+
+        try:
+            gw2api.set_session(session)
+
+            pages = list(gw2api.v2.colors.iter_pages(2, prefetch=2))
+            self.assertEqual([page.page for page in pages], [0, 1, 2, 3])
+            self.assertEqual([color["id"] for page in pages for color in page],
+                             list(range(1, 9)))
+            self.assertEqual(session.get_called, 4, "invalid request count")
+
+            pages = gw2api.v2.transactions.iter_pages(2, "history/buys",
+                                                      prefetch=0)
+            self.assertEqual(len(list(pages)), 4)
+
+            # Stopping early does not request the remaining pages.
+            pages = gw2api.v2.colors.iter_pages(2, prefetch=1)
+            self.assertEqual(next(pages).page, 0)
+            self.assertEqual(next(pages).page, 1)
+            pages.close()
+            self.assertLessEqual(session.get_called, 11)
+
+            # Without a page total, only the first page is returned.
+            self.assertEqual(list(gw2api.v2.quaggans.iter_pages()), [["404"]])
+
+        finally:
+            gw2api.set_session(saved_session)
+
+    def test_get_all_pages(self):
+        saved_session = gw2api.session
+
+        session = CountingMockSession()
+        for page in range(3):
+            data = [{"id": page * 200 + i} for i in range(200)]
+            session.add_mock_response(
+                "get", gw2api.v2.BASE_URL + "colors", json.dumps(data),
+                params={"page": page, "page_size": 200, "lang": "de"},
+                headers={"X-Page-Total": "3", "X-Result-Total": "600"})
+        session.add_mock_response(
+            "get", gw2api.v2.BASE_URL + "quaggans", json.dumps(["404"]),
+            params={"page": 0, "page_size": 200})
+
+        try:
+            gw2api.set_session(session)
+
+            colors = gw2api.v2.colors.get_all_pages("de")
+            self.assertEqual([color["id"] for color in colors],
+                             list(range(600)))
+            self.assertEqual(colors.meta,
+                             {"result_count": 600, "result_total": 600})
+            self.assertEqual(session.get_called, 3, "invalid request count")
+
+            self.assertEqual(gw2api.v2.quaggans.get_all_pages(), ["404"])
+
+        finally:
+            gw2api.set_session(saved_session)
+
+    def test_get_all_fallback(self):
+        saved_session = gw2api.session
+
+        items = [{"id": i} for i in range(1, 6)]
+        session = CountingMockSession()
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "items",
+                                  json.dumps([1, 2, 3, 4, 5]))
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "minis",
+                                  json.dumps([1, 2, 3, 4, 5]))
+        for chunk in ("1,2", "3,4", "5"):
+            for name in ("items", "minis"):
+                data = [{"id": int(id)} for id in chunk.split(",")]
+                session.add_mock_response(
+                    "get", gw2api.v2.BASE_URL + name, json.dumps(data),
+                    params={"ids": chunk, "lang": "en"})
+
+        try:
+            gw2api.set_cache_backend(MemoryCache())
+            gw2api.set_cache_time(3600)
+            gw2api.set_session(session)
+            gw2api.v2.items.max_ids = 2
+            gw2api.v2.minis.max_ids = 2
+
+            # Items are known not to support ids=all.
+            self.assertEqual(gw2api.v2.items.get_all(), items)
+            self.assertEqual(session.get_called, 4, "invalid request count")
+            self.assertEqual(list(gw2api.v2.items.iter_all()), items)
+            self.assertEqual(session.get_called, 4, "invalid request count")
+
+            # For minis, the rejection of ids=all is remembered.
+            session.add_mock_response(
+                "get", gw2api.v2.BASE_URL + "minis",
+                json.dumps({"text": "all ids not supported"}),
+                params={"ids": "all", "lang": "en"})
+            session.get_mock_response = self.reject_all(session)
+            self.assertEqual(list(gw2api.v2.minis.iter_all()), items)
+            self.assertIs(gw2api.v2.minis.supports_all, False)
+            self.assertEqual(gw2api.v2.minis.get_all(), items)
+
+        finally:
+            del gw2api.v2.items.max_ids
+            del gw2api.v2.minis.max_ids
+            gw2api.v2.minis.supports_all = None
+            gw2api.set_cache_backend(None)
+            gw2api.set_session(saved_session)
+
+    def test_fetch_many(self):
+        colors = dict((id, {"id": id}) for id in (1, 2, 3))
+        api = MockApi({"colors": colors})
+        use_session(self, api)
+        gw2api.set_cache_backend(MemoryCache())
+        self.addCleanup(gw2api.set_cache_backend, None)
+        gw2api.v2.colors.max_ids = 2
+        self.addCleanup(delattr, gw2api.v2.colors, "max_ids")
+
+        # Responses are never cached, chunks without any known id are empty.
+        for i in range(2):
+            self.assertEqual(gw2api.v2.colors.fetch_ids(), [1, 2, 3])
+            self.assertEqual(gw2api.v2.colors.fetch_many([3, 1, 8, 9],
+                                                         {"lang": "de"}),
+                             [colors[3], colors[1]])
+        self.assertEqual(api.requests[0], ("colors", {}))
+        self.assertEqual(sorted(params["ids"] for name, params in
+                                api.requests[1:3]), ["3,1", "8,9"])
+        self.assertEqual(api.requests[1][1]["lang"], "de")
+        self.assertEqual(len(api.requests), 6)
+
+    def test_get_all_bad_request(self):
+        saved_session = gw2api.session
+        session = CountingMockSession()
+        session.add_mock_response(
+            "get", gw2api.v2.BASE_URL + "minis",
+            json.dumps({"text": "invalid lang"}),
+            params={"ids": "all", "lang": "en"})
+        session.get_mock_response = self.reject_all(session)
+
+        try:
+            gw2api.set_session(session)
+
+            # Other rejections are not taken for a lack of ids=all support.
+            with self.assertRaises(requests.HTTPError):
+                gw2api.v2.minis.get_all()
+            with self.assertRaises(requests.HTTPError):
+                list(gw2api.v2.minis.iter_all())
+            self.assertIsNone(gw2api.v2.minis.supports_all)
+            self.assertEqual(session.get_called, 2, "invalid request count")
+
+        finally:
+            gw2api.v2.minis.supports_all = None
+            gw2api.set_session(saved_session)
+
+    def reject_all(self, session):
+        get_mock_response = session.get_mock_response
+
+        def reject(method, url, params=None):
+            response = get_mock_response(method, url, params)
+            if params and params.get("ids") == "all":
+                response.status_code = 400
+            return response
+        return reject
@@ -0,0 +1,162 @@
+import unittest
+
+import gw2api
+import gw2api.v2
+from gw2api.cache import MemoryCache
+from gw2api.v2.crafting import RecipeGraph, CostOptimizer
+
+from mock_requests import MockApi, use_session
+
+
+def recipe(id, output, ingredients, count=1):
+    return {"id": id, "output_item_id": output, "output_item_count": count,
+            "ingredients": [{"item_id": item_id, "count": n}
+                            for item_id, n in ingredients]}
+
+
+class MockRecipeApi(MockApi):
+    """Also serve /v2/recipes/search from the recipes.
+    """
+    def respond(self, name, params):
+        if name == "recipes/search":
+            recipes = self.entities["recipes"].values()
+            return [r["id"] for r in recipes
+                    if r["output_item_id"] == int(params["output"])]
+        return super(MockRecipeApi, self).respond(name, params)
+
+
+class TestRecipeGraph(unittest.TestCase):
+    def setUp(self):
+        self.recipes = {
+            1: recipe(1, 100, [(10, 2), (20, 1), (30, 1)]),
+            2: recipe(2, 20, [(11, 3)], count=2),
+            3: recipe(3, 30, [(20, 2)]),
+            4: recipe(4, 200, [(100, 1), (30, 2)]),
+        }
+        self.api = MockRecipeApi({"recipes": self.recipes})
+        use_session(self, self.api)
+
+    def test_resolve(self):
+        graph = RecipeGraph()
+        tree = graph.resolve(100)
+
+        # The searches of a level are followed by one recipe request.
+        recipe_requests = [params["ids"]
+                           for name, params in self.api.requests
+                           if "ids" in params]
+        self.assertEqual(recipe_requests, ["1", "2,3"])
+        self.assertEqual(len(self.api.requests), 7)
+
+        self.assertEqual(tree["recipe"], self.recipes[1])
+        counts = [(count, subtree["item_id"])
+                  for count, subtree in tree["ingredients"]]
+        self.assertEqual(counts, [(2, 10), (1, 20), (1, 30)])
+        # Subtrees are shared.
+        self.assertIs(tree["ingredients"][1][1],
+                      tree["ingredients"][2][1]["ingredients"][0][1])
+
+        self.assertEqual(graph.materials(100), {10: 2, 11: 6})
+        self.assertEqual(graph.materials(100, 3), {10: 6, 11: 15})
+
+        # Only the new item is searched for.
+        self.api.requests = []
+        self.assertEqual(graph.materials(200), {10: 2, 11: 12})
+        self.assertEqual(self.api.requests,
+                         [("recipes/search", {"output": 200}),
+                          ("recipes", {"ids": "4"})])
+
+    def test_load(self):
+        graph = RecipeGraph(recipe_endpoint=gw2api.v2.recipes)
+        graph.load()
+        self.assertEqual(graph.recipes_for(20), [self.recipes[2]])
+
+        self.api.requests = []
+        self.assertEqual(graph.materials(200), {10: 2, 11: 12})
+        self.assertEqual(self.api.requests, [])
+
+    def test_cycle(self):
+        graph = RecipeGraph([recipe(1, 10, [(20, 1)]),
+                             recipe(2, 20, [(10, 1)])])
+        graph.complete = True
+        self.assertEqual(graph.materials(10), {10: 1})
+
+
+def price(id, sells):
+    return {"id": id, "buys": {"unit_price": sells // 2, "quantity": 1},
+            "sells": {"unit_price": sells, "quantity": 1}}
+
+
+class TestCostOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.graph = RecipeGraph([
+            recipe(1, 100, [(10, 2), (20, 1)]),
+            recipe(2, 20, [(11, 3)], count=2),
+            recipe(3, 20, [(12, 1)]),
+            recipe(4, 200, [(100, 1), (20, 2)]),
+            # A cycle
+            recipe(5, 300, [(301, 1)]),
+            recipe(6, 301, [(300, 1)]),
+        ])
+        self.optimizer = CostOptimizer(self.graph)
+        self.optimizer.set_prices([price(10, 5), price(11, 2), price(12, 10),
+                                   price(20, 4), price(100, 50),
+                                   price(200, 100), price(300, 7)])
+
+    def test_costs(self):
+        optimizer = self.optimizer
+        self.assertEqual(optimizer.cost(20), 3)
+        self.assertEqual(optimizer.source(20), self.graph.recipes[2])
+        self.assertEqual(optimizer.cost(100), 13)
+        self.assertEqual(optimizer.cost(200), 19)
+        self.assertEqual(optimizer.cost(300), 7)
+        self.assertEqual(optimizer.source(300), "buy")
+        # One recipe of the cycle is left out.
+        self.assertIsNone(optimizer.source(301))
+        self.assertEqual(optimizer.items()[100], 13)
+
+        optimizer.side = "buys"
+        optimizer.set_prices([price(100, 20)])
+        self.assertEqual(optimizer.cost(100), 10)
+        self.assertEqual(optimizer.source(100), "buy")
+        self.assertEqual(optimizer.cost(200), float("inf"))
+        self.assertIsNone(optimizer.source(200))
+
+    def test_update_prices(self):
+        optimizer = self.optimizer
+        changed = optimizer.update_prices([price(11, 10), price(300, 7)])
+        self.assertEqual(changed, [11, 20, 100, 200])
+        self.assertEqual(optimizer.cost(20), 4)
+        self.assertEqual(optimizer.source(20), "buy")
+        self.assertEqual(optimizer.cost(100), 14)
+
+        self.assertEqual(optimizer.update_prices([price(12, 10)]), [])
+
+        changed = optimizer.update_prices([price(20, 3)])
+        self.assertEqual(changed, [20, 100, 200])
+        self.assertEqual(optimizer.cost(20), 3)
+        self.assertEqual(optimizer.source(20), "buy")
+        self.assertEqual(optimizer.cost(200), 19)
+
+    def test_refresh(self):
+        gw2api.set_cache_backend(MemoryCache())
+        self.addCleanup(gw2api.set_cache_backend, None)
+        gw2api.v2.prices.max_ids = 4
+        self.addCleanup(delattr, gw2api.v2.prices, "max_ids")
+
+        # The last chunk only contains items that can not be traded.
+        prices = {10: price(10, 1), 11: price(11, 1), 12: price(12, 1)}
+        api = MockApi({"commerce/prices": prices})
+        use_session(self, api)
+        changed = self.optimizer.refresh()
+
+        self.assertIn(200, changed)
+        self.assertEqual(self.optimizer.cost(20), 1)
+        self.assertEqual(self.optimizer.cost(200), 5)
+        self.assertIsNone(self.optimizer.source(300))
+
+        # Prices are never served from the cache.
+        prices[12] = price(12, 3)
+        prices[11] = price(11, 3)
+        self.assertEqual(self.optimizer.refresh(), [11, 12, 20, 100, 200])
+        self.assertEqual(self.optimizer.cost(20), 3)
+        self.assertEqual(len(api.requests), 4)
@@ -0,0 +1,56 @@
+import unittest
+
+from gw2api.v2.itemstore import ItemStore
+
+
+ITEMS = [
+    {"id": 1, "type": "Weapon", "rarity": "Exotic", "level": 80,
+     "flags": ["NoSalvage", "AccountBound"]},
+    {"id": 2, "type": "Weapon", "rarity": "Exotic", "level": 80,
+     "flags": []},
+    {"id": 3, "type": "Weapon", "rarity": "Ascended", "level": 80,
+     "flags": ["NoSalvage"]},
+    {"id": 4, "type": "Armor", "rarity": "Exotic", "level": 78,
+     "flags": ["NoSalvage"]},
+    {"id": 5, "type": "Trophy", "rarity": "Basic", "level": 0},
+]
+
+
+class TestItemStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ItemStore(ITEMS)
+
+    def ids(self, **criteria):
+        return [item["id"] for item in self.store.query(**criteria)]
+
+    def test_query(self):
+        self.assertEqual(self.ids(type="Weapon", rarity="Exotic", level=80,
+                                  flags="NoSalvage"), [1])
+        self.assertEqual(self.ids(type="Weapon"), [1, 2, 3])
+        self.assertEqual(self.ids(rarity=["Exotic", "Ascended"],
+                                  flags="NoSalvage"), [1, 3, 4])
+        self.assertEqual(self.ids(flags=["NoSalvage", "AccountBound"]), [1])
+        self.assertEqual(self.ids(min_level=1, max_level=79), [4])
+        self.assertEqual(self.ids(min_level=80, type="Armor"), [])
+        self.assertEqual(self.ids(type="Bag"), [])
+        self.assertEqual(self.ids(), [1, 2, 3, 4, 5])
+
+        with self.assertRaises(ValueError):
+            self.store.query(name="Foo")
+
+    def test_update(self):
+        self.assertEqual(len(self.store), 5)
+        self.assertIn(3, self.store)
+        self.assertEqual(self.store.get(5)["type"], "Trophy")
+
+        self.store.add({"id": 3, "type": "Armor", "rarity": "Ascended",
+                        "level": 80, "flags": ["NoSalvage", "NoSalvage"]})
+        self.assertEqual(self.ids(type="Weapon"), [1, 2])
+        self.assertEqual(self.ids(type="Armor"), [3, 4])
+
+        self.store.remove(3)
+        self.store.remove(3)
+        self.assertEqual(self.ids(flags="NoSalvage"), [1, 4])
+        self.assertNotIn("Ascended", self.store.values("rarity"))
+        self.assertEqual(self.store.values("type"),
+                         {"Weapon": 2, "Armor": 1, "Trophy": 1})
@@ -0,0 +1,123 @@
+import unittest
+
+import gw2api
+import gw2api.v2
+from gw2api.cache import MemoryCache
+from gw2api.v2.mirror import Mirror
+
+from mock_requests import MockApi, use_session
+
+
+class TestMirror(unittest.TestCase):
+    def setUp(self):
+        self.recipes = dict((id, {"id": id, "output_item_id": id * 10})
+                            for id in range(1, 8))
+        self.api = MockApi({"recipes": self.recipes})
+        use_session(self, self.api)
+        gw2api.v2.recipes.max_ids = 2
+        gw2api.v2.recipes.max_workers = 2
+        self.backend = MemoryCache()
+        self.mirror = Mirror(gw2api.v2.recipes, self.backend)
+
+    def tearDown(self):
+        del gw2api.v2.recipes.max_ids
+        del gw2api.v2.recipes.max_workers
+
+    def test_sync(self):
+        result = self.mirror.sync()
+        self.assertEqual(result, {"added": 7, "updated": 0, "unchanged": 0,
+                                  "removed": 0})
+        self.assertEqual(len(self.mirror), 7)
+        self.assertEqual(self.mirror.get(3), self.recipes[3])
+        self.assertEqual(list(self.mirror),
+                         [self.recipes[id] for id in range(1, 8)])
+
+        # Only new ids are requested, removed ids are deleted.
+        del self.recipes[2]
+        self.recipes[8] = {"id": 8, "output_item_id": 80}
+        self.api.requested = []
+        result = self.mirror.sync()
+        self.assertEqual(self.api.requested, ["8"])
+        self.assertEqual(result, {"added": 1, "updated": 0, "unchanged": 0,
+                                  "removed": 1})
+        self.assertNotIn(2, self.mirror)
+        self.assertIn(8, self.mirror)
+        self.assertEqual(self.mirror.get_many([8, 2, 1]),
+                         [self.recipes[8], self.recipes[1]])
+
+    def test_build_change(self):
+        self.mirror.sync()
+
+        # All entities are checked again when the build changes.
+        self.recipes[4] = {"id": 4, "output_item_id": 44}
+        self.api.build = 2
+        self.api.requested = []
+        result = self.mirror.sync()
+        self.assertEqual(len(self.api.requested), 7)
+        self.assertEqual(result, {"added": 0, "updated": 1, "unchanged": 6,
+                                  "removed": 0})
+        self.assertEqual(self.mirror.get(4), self.recipes[4])
+
+    def test_resume(self):
+        # The connection is lost after the first group of chunks.
+        self.api.fail_after = 4
+        with self.assertRaises(IOError):
+            self.mirror.sync()
+        self.assertEqual(self.api.requested, ["1", "2", "3", "4"])
+        # Ids are only published when the sync has finished.
+        self.assertEqual(len(self.mirror), 0)
+        self.assertEqual(list(self.mirror), [])
+
+        self.api.fail_after = None
+        self.api.requested = []
+        result = self.mirror.sync()
+        self.assertEqual(self.api.requested, ["5", "6", "7"])
+        self.assertEqual(result["added"], 3)
+        self.assertEqual(len(list(self.mirror)), 7)
+
+    def test_interrupted_update(self):
+        self.mirror.sync()
+        del self.recipes[1]
+        self.recipes[8] = {"id": 8, "output_item_id": 80}
+        self.recipes[9] = {"id": 9, "output_item_id": 90}
+        self.recipes[10] = {"id": 10, "output_item_id": 100}
+        self.recipes[11] = {"id": 11, "output_item_id": 110}
+        self.recipes[12] = {"id": 12, "output_item_id": 120}
+
+        self.api.requested = []
+        self.api.fail_after = 4
+        with self.assertRaises(IOError):
+            self.mirror.sync()
+        self.assertEqual(self.mirror.ids(), [str(id) for id in range(2, 8)])
+        self.assertEqual(len(list(self.mirror)), 6)
+
+        # The entities stored before the interruption are not requested
+        # again, removed entities are noticed.
+        del self.recipes[9]
+        self.api.fail_after = None
+        self.api.requested = []
+        result = self.mirror.sync()
+        self.assertEqual(self.api.requested, ["12"])
+        self.assertEqual(result, {"added": 1, "updated": 0, "unchanged": 0,
+                                  "removed": 1})
+        self.assertEqual(self.mirror.ids(),
+                         [str(id) for id in range(2, 13) if id != 9])
+        self.assertEqual(len(list(self.mirror)), 10)
+
+    def test_uncached_ids(self):
+        gw2api.set_cache_backend(MemoryCache())
+        self.addCleanup(gw2api.set_cache_backend, None)
+        self.mirror.sync()
+
+        self.recipes[8] = {"id": 8, "output_item_id": 80}
+        result = self.mirror.sync()
+        self.assertEqual(result["added"], 1)
+        self.assertEqual(len(self.mirror), 8)
+
+    def test_locale_aware(self):
+        mirror = Mirror(gw2api.v2.items, self.backend)
+        self.assertEqual(mirror.lang, "en")
+        self.assertEqual(mirror.prefix, "mirror.items.en")
+
+        mirror = Mirror(gw2api.v2.prices, self.backend)
+        self.assertEqual(mirror.prefix, "mirror.commerce_prices")
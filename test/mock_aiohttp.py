@@ -0,0 +1,52 @@
+import json
+
+from mock_requests import MockSession
+
+
+class MockStreamReader(object):
+    def __init__(self, content):
+        super(MockStreamReader, self).__init__()
+        self.content = content
+
+    def iter_chunked(self, n):
+        return MockChunkIterator(self.content, n)
+
+
+class MockChunkIterator(object):
+    def __init__(self, content, n):
+        super(MockChunkIterator, self).__init__()
+        self.chunks = [content[i:i + n] for i in range(0, len(content), n)]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+
+class MockAsyncResponse(object):
+    def __init__(self, response):
+        super(MockAsyncResponse, self).__init__()
+        self.response = response
+        self.status = response.status_code
+        self.reason = response.reason
+        self.headers = response.headers
+        self.content = MockStreamReader(response.content)
+
+    async def json(self, content_type="application/json"):
+        content = self.response.content
+        return json.loads(content.decode("utf-8")) if content else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class MockAsyncSession(MockSession):
+    def get(self, url, **kwargs):
+        response = super(MockAsyncSession, self).get(url, **kwargs)
+        return MockAsyncResponse(response)
@@ -1,13 +1,27 @@
-import urllib
+import json
+
 import requests
 
 import six
+from six.moves.urllib.parse import urlencode
+
+import gw2api
+import gw2api.v2
+
+
+def use_session(test, session):
+    """Send requests through ``session`` until ``test`` has finished.
+    """
+    saved_session = gw2api.session
+    gw2api.set_session(session)
+    test.addCleanup(gw2api.set_session, saved_session)
 
 
 class MockSession(object):
     def __init__(self):
         super(MockSession, self).__init__()
         self.responses = {}
+        self.response_headers = {}
 
     def add_params(self, url, params):
         if not params:
@@ -16,7 +30,7 @@ class MockSession(object):
         if isinstance(params, dict):
             params = params.items()
 
-        return url + "?" + urllib.urlencode(sorted(params))
+        return url + "?" + urlencode(sorted(params))
 
     def get_mock_response(self, method, url, params=None):
         url = self.add_params(url, params)
@@ -31,14 +45,19 @@ class MockSession(object):
         if response_data is None:
             response.status_code = 404
             response.reason = url + " not found"
+            response.raw = six.BytesIO(b"")
         else:
             response.status_code = 200
             response.raw = six.BytesIO(response_data)
+            response.headers.update(self.response_headers.get(url, {}))
 
         return response
 
-    def add_mock_response(self, method, url, response, params=None):
+    def add_mock_response(self, method, url, response, params=None,
+                          headers=None):
         url = self.add_params(url, params)
+        if headers:
+            self.response_headers[url] = headers
 
         if isinstance(response, six.text_type):
             response = response.encode("utf-8")
@@ -55,3 +74,58 @@ class MockSession(object):
 
     def post(self, url, **kwargs):
         return self.get_mock_response("post", url, kwargs.get("params"))
+
+
+class MockApi(MockSession):
+    """Serve v2 endpoints from dictionaries of entities.
+
+    :param entities: a dictionary of endpoint names (such as ``"recipes"``)
+                     and dictionaries of their entities by id
+    :param build: the build id to serve from ``/v2/build``
+
+    Requests with ``ids`` get the entities that exist, or ``404`` if none of
+    them do. Requests without parameters get the sorted ids. Every request is
+    recorded in ``requests`` as ``(name, params)``, and every requested id in
+    ``requested``. Once ``fail_after`` ids were requested, requests for more
+    ids fail with an :class:`IOError`.
+    """
+    def __init__(self, entities=None, build=1):
+        super(MockApi, self).__init__()
+        self.entities = entities or {}
+        self.build = build
+        self.requests = []
+        self.requested = []
+        self.fail_after = None
+
+    def respond(self, name, params):
+        """Get the data to respond with, or ``None`` for ``404``.
+        """
+        if name == "build":
+            return {"id": self.build}
+
+        entities = self.entities.get(name)
+        if entities is None:
+            return None
+        if "ids" not in params:
+            return sorted(entities)
+
+        if self.fail_after is not None and \
+                len(self.requested) >= self.fail_after:
+            raise IOError("connection lost")
+        ids = params["ids"].split(",")
+        self.requested.extend(ids)
+        return [entities[int(id)] for id in ids if int(id) in entities] or None
+
+    def get(self, url, **kwargs):
+        params = kwargs.get("params") or {}
+        name = url[len(gw2api.v2.BASE_URL):]
+        self.requests.append((name, params))
+
+        data = self.respond(name, params)
+        if data is None:
+            self.responses.get("get", {}).pop(self.add_params(url, params),
+                                              None)
+        else:
+            self.add_mock_response("get", url, json.dumps(data),
+                                   params=params)
+        return super(MockApi, self).get(url, **kwargs)
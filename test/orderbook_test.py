@@ -0,0 +1,74 @@
+import unittest
+
+import gw2api
+import gw2api.v2
+from gw2api.cache import MemoryCache
+from gw2api.v2.orderbook import OrderBook
+
+from mock_requests import MockApi, use_session
+
+
+def levels(*levels):
+    return [{"listings": 1, "unit_price": price, "quantity": quantity}
+            for price, quantity in levels]
+
+
+class TestOrderBook(unittest.TestCase):
+    def setUp(self):
+        self.listings = [
+            {"id": 1,
+             "buys": levels((90, 5), (100, 10), (80, 20)),
+             "sells": levels((110, 10), (120, 100), (150, 40))},
+            {"id": 2, "buys": [], "sells": levels((5, 1))},
+        ]
+        self.book = OrderBook(self.listings)
+
+    def test_queries(self):
+        book = self.book
+        self.assertEqual(book.best(1), 110)
+        self.assertEqual(book.best(1, "buys"), 100)
+        self.assertIsNone(book.best(2, "buys"))
+        self.assertEqual(book.spread(1), 10)
+        self.assertIsNone(book.spread(2))
+        self.assertEqual(book.quantity(1), 150)
+
+        self.assertEqual(book.fill_cost(1, 5), 550)
+        self.assertEqual(book.fill_cost(1, 10), 1100)
+        self.assertEqual(book.fill_cost(1, 15), 1700)
+        self.assertEqual(book.fill_cost(1, 150), 19100)
+        self.assertIsNone(book.fill_cost(1, 151))
+        self.assertEqual(book.fill_cost(1, 12, "buys"), 1180)
+
+        self.assertEqual(book.depth(1, 100), 0)
+        self.assertEqual(book.depth(1, 120), 110)
+        self.assertEqual(book.depth(1, 90, "buys"), 15)
+        self.assertEqual(book.depth(1, 101, "buys"), 0)
+
+    def test_bulk(self):
+        book = self.book
+        self.assertEqual(book.fill_costs(1), {1: 110, 2: 5})
+        self.assertEqual(book.fill_costs(2), {1: 220})
+        self.assertEqual(book.fill_costs(10, "buys"), {1: 1000})
+        self.assertEqual(book.spreads(), {1: 10})
+        self.assertEqual(book.depths({1: 120, 2: 4, 3: 1}), {1: 110, 2: 0})
+
+        with self.assertRaises(ValueError):
+            book.add(self.listings[0])
+
+    def test_fetch(self):
+        gw2api.set_cache_backend(MemoryCache())
+        self.addCleanup(gw2api.set_cache_backend, None)
+        listings = dict((entry["id"], entry) for entry in self.listings)
+        api = MockApi({"commerce/listings": listings})
+        use_session(self, api)
+
+        book = OrderBook.fetch([1, 2])
+        self.assertEqual(len(book), 2)
+        self.assertIn(2, book)
+        self.assertEqual(book.fill_cost(2, 1), 5)
+
+        # Listings are never served from the cache.
+        listings[2] = {"id": 2, "buys": [], "sells": levels((7, 1))}
+        listings[3] = {"id": 3, "buys": [], "sells": levels((9, 1))}
+        book = OrderBook.fetch()
+        self.assertEqual(book.fill_costs(1), {1: 110, 2: 7, 3: 9})
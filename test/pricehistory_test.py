@@ -0,0 +1,127 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+import gw2api
+import gw2api.v2
+from gw2api.cache import MemoryCache
+from gw2api.v2.pricehistory import PriceHistory, PriceCollector
+
+from mock_requests import MockApi, use_session
+
+
+def price(id, buy, sell):
+    return {"id": id, "buys": {"unit_price": buy, "quantity": id},
+            "sells": {"unit_price": sell, "quantity": id * 2}}
+
+
+class TestPriceHistory(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def fill(self, history):
+        history.append(10, [price(3, 30, 31), price(1, 10, 11)])
+        history.append(20, [price(1, 12, 13), price(2, 20, 21)])
+        history.append(30, [price(1, 14, 15), price(3, 32, 33)])
+
+    def test_queries(self):
+        history = PriceHistory()
+        self.fill(history)
+        self.assertEqual(len(history), 3)
+
+        self.assertEqual(history.item(1), [(10, 10, 1, 11, 2),
+                                           (20, 12, 1, 13, 2),
+                                           (30, 14, 1, 15, 2)])
+        self.assertEqual(history.item(3, start=15), [(30, 32, 3, 33, 6)])
+        self.assertEqual(history.item(1, start=10, end=30),
+                         [(10, 10, 1, 11, 2), (20, 12, 1, 13, 2)])
+        self.assertEqual(history.item(4), [])
+
+        self.assertEqual(history.at(25), {1: (12, 1, 13, 2),
+                                          2: (20, 2, 21, 4)})
+        self.assertEqual(history.at(5), {})
+
+        with self.assertRaises(ValueError):
+            history.append(25, [price(1, 1, 1)])
+
+    def test_max_rows(self):
+        directory = os.path.join(self.temp_dir, "prices")
+        history = PriceHistory(directory)
+        # End rows are 64-bit, so they do not overflow past 2 ** 31 rows.
+        history.ends.append(2 ** 31)
+        del history.ends[:]
+
+        self.fill(history)
+        history.max_rows = 7
+        with self.assertRaises(ValueError):
+            history.append(40, [price(1, 1, 1), price(2, 2, 2)])
+        # Nothing is written when the snapshot does not fit.
+        self.assertEqual(len(history.data["item_ids"]), 6)
+        history.append(40, [price(1, 1, 1)])
+
+        history = PriceHistory(directory)
+        self.assertEqual(len(history), 4)
+        self.assertEqual(list(history.ends), [2, 4, 6, 7])
+
+    def test_files(self):
+        directory = os.path.join(self.temp_dir, "prices")
+        self.fill(PriceHistory(directory))
+
+        history = PriceHistory(directory)
+        self.assertEqual(len(history), 3)
+        # Values are 32-bit on every platform.
+        self.assertEqual(os.path.getsize(os.path.join(directory,
+                                                      "item_ids.bin")), 24)
+        self.assertEqual(history.item(3), [(10, 30, 3, 31, 6),
+                                           (30, 32, 3, 33, 6)])
+
+        # An interrupted append is dropped.
+        history.write_column("item_ids", history.data["item_ids"][:1])
+        history = PriceHistory(directory)
+        history.append(40, [price(2, 22, 23)])
+        history = PriceHistory(directory)
+        self.assertEqual(len(history.data["item_ids"]), 7)
+        self.assertEqual(history.item(2), [(20, 20, 2, 21, 4),
+                                           (40, 22, 2, 23, 4)])
+
+
+class TestPriceCollector(unittest.TestCase):
+    def setUp(self):
+        prices = dict((id, price(id, id * 10, id * 11)) for id in range(1, 6))
+        self.api = MockApi({"commerce/prices": prices})
+        use_session(self, self.api)
+        gw2api.v2.prices.max_ids = 2
+        gw2api.v2.prices.max_workers = 2
+
+    def tearDown(self):
+        del gw2api.v2.prices.max_ids
+        del gw2api.v2.prices.max_workers
+
+    def test_collect(self):
+        history = PriceHistory()
+        collector = PriceCollector(history, interval=0)
+        collector.run(count=2)
+
+        chunks = [params["ids"] for name, params in self.api.requests
+                  if "ids" in params]
+        self.assertEqual(sorted(chunks), ["1,2", "1,2", "3,4",
+                                                   "3,4", "5", "5"])
+        self.assertEqual(len(history), 2)
+        self.assertEqual(len(history.at(history.times[-1])), 5)
+        self.assertEqual([entry[1] for entry in history.item(5)], [50, 50])
+
+    def test_new_items(self):
+        gw2api.set_cache_backend(MemoryCache())
+        self.addCleanup(gw2api.set_cache_backend, None)
+        history = PriceHistory()
+        collector = PriceCollector(history)
+        self.assertEqual(collector.collect(), 5)
+
+        # The ids of tradable items are not served from the cache.
+        self.api.entities["commerce/prices"][6] = price(6, 60, 66)
+        self.assertEqual(collector.collect(), 6)
+        self.assertEqual(history.item(6)[0][1:], (60, 6, 66, 12))
@@ -0,0 +1,141 @@
+import unittest
+import json
+import time
+from email.utils import formatdate
+
+import requests
+import six
+
+import gw2api
+import gw2api.v2
+from gw2api import ratelimit
+from gw2api.ratelimit import TokenBucket
+
+from mock_requests import MockSession
+
+
+class RateLimitedMockSession(MockSession):
+    """Respond with status 429 to the first ``limited`` requests.
+    """
+    def __init__(self, limited, retry_after=None):
+        super(RateLimitedMockSession, self).__init__()
+        self.limited = limited
+        self.retry_after = retry_after
+        self.requests = []
+
+    def get(self, url, **kwargs):
+        self.requests.append(kwargs)
+        if len(self.requests) <= self.limited:
+            response = requests.Response()
+            response.status_code = 429
+            response.reason = "Too Many Requests"
+            response.raw = six.BytesIO(b"")
+            if self.retry_after is not None:
+                response.headers["Retry-After"] = self.retry_after
+            return response
+        return super(RateLimitedMockSession, self).get(url, **kwargs)
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.saved_session = gw2api.session
+        gw2api.set_retries(3, backoff=0.001)
+        ratelimit.reset_stats()
+
+    def tearDown(self):
+        gw2api.set_session(self.saved_session)
+        gw2api.set_retries(3, backoff=1.0)
+        gw2api.rate_limits.clear()
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(10, burst=2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, places=2)
+
+        # Tokens are refilled over time, up to the burst size.
+        bucket.updated -= 10
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.tokens, 1)
+
+    def test_rate_limit(self):
+        gw2api.set_rate_limit(100, burst=1)
+        gw2api.set_rate_limit(1, token="secret")
+
+        self.assertEqual(ratelimit.reserve(), 0)
+        self.assertGreater(ratelimit.reserve(), 0)
+
+        # Requests with an API key also wait for the limiter of the key.
+        self.assertLess(ratelimit.reserve("secret"), 0.5)
+        self.assertGreater(ratelimit.reserve("secret"), 0.5)
+        self.assertLess(ratelimit.reserve("other"), 0.5)
+
+        stats = ratelimit.stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["waits"], 4)
+        self.assertGreater(stats["wait_time"], 1)
+
+        gw2api.set_rate_limit(None, token="secret")
+        gw2api.set_rate_limit(None)
+        self.assertEqual(gw2api.rate_limits, {})
+
+    def test_api_key(self):
+        kwargs = {"headers": {"Authorization": "Bearer secret"}}
+        self.assertEqual(ratelimit.api_key(kwargs), "secret")
+        self.assertIsNone(ratelimit.api_key({}))
+        self.assertIsNone(ratelimit.api_key({"headers": None}))
+
+    def test_parse_retry_after(self):
+        self.assertEqual(ratelimit.parse_retry_after("5"), 5)
+        self.assertIsNone(ratelimit.parse_retry_after(None))
+        self.assertIsNone(ratelimit.parse_retry_after("soon"))
+
+        date = formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(ratelimit.parse_retry_after(date), 60, -1)
+
+    def test_retry_delay(self):
+        self.assertIsNone(ratelimit.retry_delay(200, {}, 0))
+        self.assertIsNone(ratelimit.retry_delay(429, {}, 3))
+
+        gw2api.set_retries(3, backoff=1.0)
+        delays = [ratelimit.retry_delay(429, {}, attempt)
+                  for attempt in range(3)]
+        for attempt, delay in enumerate(delays):
+            self.assertTrue(2 ** attempt / 2.0 <= delay <= 2 ** attempt)
+
+        delay = ratelimit.retry_delay(429, {"retry-after": "30"}, 0)
+        self.assertEqual(delay, 30)
+
+        stats = ratelimit.stats()
+        self.assertEqual(stats["rate_limited"], 5)
+        self.assertEqual(stats["retries"], 4)
+
+    def test_retry(self):
+        session = RateLimitedMockSession(2, retry_after="0")
+        session.add_mock_response("get", gw2api.v2.BASE_URL + "quaggans",
+                                  json.dumps(["404"]))
+        gw2api.set_session(session)
+
+        self.assertEqual(gw2api.v2.quaggans.get_ids(), ["404"])
+        self.assertEqual(len(session.requests), 3)
+        self.assertEqual(ratelimit.stats()["retries"], 2)
+
+    def test_retries_exhausted(self):
+        session = RateLimitedMockSession(10)
+        gw2api.set_session(session)
+        gw2api.set_retries(1)
+
+        with self.assertRaises(requests.HTTPError) as context:
+            gw2api.v2.quaggans.get_ids()
+        self.assertIn("429", str(context.exception))
+        self.assertEqual(len(session.requests), 2)
+
+    def test_retry_v1(self):
+        session = RateLimitedMockSession(1)
+        session.add_mock_response("get", gw2api.BASE_URL + "build.json",
+                                  json.dumps({"build_id": 1234}))
+        gw2api.set_session(session)
+
+        self.assertEqual(gw2api.build(), 1234)
+        self.assertEqual(len(session.requests), 2)
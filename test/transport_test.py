@@ -0,0 +1,76 @@
+import unittest
+import threading
+
+import gw2api
+from gw2api.transport import Transport
+
+from mock_requests import MockSession
+
+
+class RecordingMockSession(MockSession):
+    def __init__(self):
+        super(RecordingMockSession, self).__init__()
+        self.requests = []
+
+    def get(self, url, **kwargs):
+        self.requests.append(kwargs)
+        return super(RecordingMockSession, self).get(url, **kwargs)
+
+
+class TestTransport(unittest.TestCase):
+    def test_thread_sessions(self):
+        transport = Transport(pool_maxsize=4)
+        sessions = []
+
+        def worker():
+            sessions.append(transport.get_session())
+
+        threads = [threading.Thread(target=worker) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every thread has its own session, but they share a connection pool.
+        self.assertIs(transport.get_session(), transport.get_session())
+        self.assertEqual(len(set(map(id, sessions))), 3)
+        for session in sessions:
+            self.assertIs(session.get_adapter("https://example.com"),
+                          transport.adapter)
+        self.assertEqual(transport.adapter._pool_maxsize, 4)
+
+        transport.close()
+
+    def test_keep_alive(self):
+        transport = Transport(keep_alive=False)
+        self.assertEqual(transport.get_session().headers["Connection"],
+                         "close")
+
+    def test_timeout(self):
+        session = RecordingMockSession()
+        transport = Transport(session=session, timeout=10)
+        self.assertIs(transport.get_session(), session)
+
+        transport.get("https://example.com")
+        transport.get("https://example.com", timeout=1)
+        self.assertEqual(session.requests, [{"timeout": 10}, {"timeout": 1}])
+
+        transport = Transport(session=session, timeout=None)
+        transport.get("https://example.com")
+        self.assertEqual(session.requests[-1], {})
+
+    def test_set_session(self):
+        saved_session = gw2api.session
+        session = RecordingMockSession()
+
+        try:
+            gw2api.set_session(session)
+            self.assertIs(gw2api.session, session)
+            self.assertIs(gw2api.transport.get_session(), session)
+
+            transport = Transport()
+            gw2api.set_transport(transport)
+            self.assertIs(gw2api.transport, transport)
+            self.assertIsNone(gw2api.session)
+        finally:
+            gw2api.set_session(saved_session)
@@ -1,6 +1,10 @@
 import unittest
+import json
 import os
 import tempfile
+import shutil
+import time
+import threading
 
 import gw2api
 import gw2api.util
@@ -232,12 +236,19 @@ class TestUtil(unittest.TestCase):
             self.assertEqual(response, {"foo": "bar"}, "invalid response")
             self.assertEqual(session.get_called, 2, "invalid request count")
 
+            # Disable caching for this path using a policy.
+            gw2api.set_cache_policy("test.*", 0)
+            response = gw2api.util.get_cached("test.json")
+            self.assertEqual(response, {"foo": "bar"}, "invalid response")
+            self.assertEqual(session.get_called, 3, "invalid request count")
+
         finally:
             if os.path.exists(cache_file):
                 os.unlink(cache_file)
             os.rmdir(cache_dir)
 
             gw2api.set_cache_dir(None)
+            gw2api.set_cache_policy("test.*", None)
 
     def test_set_cache_dir(self):
         temp_dir = tempfile.mkdtemp()
@@ -266,6 +277,27 @@ class TestUtil(unittest.TestCase):
 
             gw2api.set_cache_dir(None)
 
+    def test_set_cache_dir_sqlite(self):
+        cache_dir = tempfile.mkdtemp()
+
+        try:
+            gw2api.set_cache_dir(cache_dir, store="sqlite")
+            self.assertEqual(gw2api.cache_dir, cache_dir)
+            self.assertIsInstance(gw2api.cache_backend,
+                                  gw2api.cache.SqliteCache)
+            self.assertTrue(os.path.exists(os.path.join(cache_dir,
+                                                        "cache.sqlite")))
+
+            with self.assertRaises(ValueError) as context:
+                gw2api.set_cache_dir(cache_dir, store="invalid")
+            self.assertEqual(str(context.exception),
+                             "unknown cache store 'invalid'")
+
+        finally:
+            gw2api.cache_backend.close()
+            gw2api.set_cache_dir(None)
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
     def test_error_extraction(self):
         gw2api.set_session(requests.Session())
 
@@ -277,6 +309,79 @@ class TestUtil(unittest.TestCase):
             gw2api.util.get_cached("map_floor.json")
         self.assertIn("missing continent_id or floor", str(context.exception))
 
+    def test_parallel_map(self):
+        items = list(range(10))
+        result = gw2api.v2.util.parallel_map(lambda x: x * 2, items, 3)
+        self.assertEqual(result, [x * 2 for x in items])
+        self.assertEqual(gw2api.v2.util.parallel_map(str, [], 3), [])
+
+    def test_iter_json_array(self):
+        data = [{"id": 1, "name": "\u00e9", "nested": [1, {"a": "]"}]},
+                123, "text", None, True]
+        encoded = json.dumps(data).encode("utf-8")
+        for size in (1, 3, 16, len(encoded)):
+            chunks = [encoded[i:i + size]
+                      for i in range(0, len(encoded), size)]
+            self.assertEqual(
+                list(gw2api.v2.util.iter_json_array(chunks)), data)
+
+        self.assertEqual(list(gw2api.v2.util.iter_json_array([b" [ ] "])), [])
+        self.assertEqual(
+            list(gw2api.v2.util.iter_json_array([b"[12", b"3]"])), [123])
+
+        for invalid in (b"[1, 2", b"{}", b"[1 2]", b"[1,]", b""):
+            with self.assertRaises(ValueError):
+                list(gw2api.v2.util.iter_json_array([invalid]))
+
+    def test_single_flight(self):
+        single_flight = gw2api.v2.util.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def slow():
+            calls.append("slow")
+            started.set()
+            release.wait()
+            return "result"
+
+        def worker():
+            results.append(single_flight.call("key", slow))
+
+        threads = [threading.Thread(target=worker) for i in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.1)
+        # Calls for other keys are not blocked.
+        self.assertEqual(single_flight.call("other", lambda: 1), 1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, ["slow"])
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(single_flight.calls, {})
+
+    def test_single_flight_error(self):
+        single_flight = gw2api.v2.util.SingleFlight()
+
+        def fail():
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError):
+            single_flight.call("key", fail)
+        self.assertEqual(single_flight.call("key", lambda: 2), 2)
+
+    def test_merge_meta(self):
+        meta = gw2api.v2.util.merge_meta([
+            {"result_total": 5, "result_count": 2, "self": "/v2/a?ids=1,2"},
+            {"result_total": 5, "result_count": 3, "self": "/v2/a?ids=3,4,5"},
+        ])
+        self.assertEqual(meta, {"result_total": 5, "result_count": 5})
+
     def test_list_wrapper(self):
         pages = [[1, 2], [3, 4], [5, 6]]
 